@@ -8,10 +8,14 @@ import time
 import logging
 import threading
 import random
+from functools import lru_cache
 from typing import Dict, Any, Optional, List, Tuple
 
 logger = logging.getLogger("NuTetra.Atlas")
 
+# Dedicated RNG instance for simulation-mode readings
+_RNG = random.Random()
+
 # Atlas Scientific I2C addresses (default)
 ATLAS_SENSOR_ADDRESSES = {
     'pH': 0x63,    # Default pH sensor address
@@ -31,6 +35,55 @@ ATLAS_COMMANDS = {
     'TEMP_COMP': 'T',   # Set temperature compensation
 }
 
+# Atlas response codes (first byte of a read)
+ATLAS_RESPONSE_SUCCESS = 1
+ATLAS_RESPONSE_ERROR = 2
+ATLAS_RESPONSE_BUSY = 254
+ATLAS_RESPONSE_NO_DATA = 255
+
+# Worst-case processing times per command (seconds), per the Atlas datasheets.
+# Used as polling deadlines; most commands finish much earlier.
+ATLAS_COMMAND_TIMEOUTS = {
+    'R': 1.0,       # Reads take up to 600ms on pH/EC/RTD
+    'Cal': 1.5,     # Calibration takes up to 900ms
+    'X': 1.5,       # Factory reset
+    'I': 0.5,
+    'Status': 0.5,
+    'Sleep': 0.5,
+    'T': 0.5,
+}
+
+# Expected response sizes per command (bytes, including the response
+# code). Reading only what a command can return keeps bus time down;
+# unknown commands fall back to the full 31-byte buffer. Only commands
+# whose reply length is fixed for every circuit are listed — 'R' and
+# 'Status' are deliberately absent because the EC circuit answers them
+# with CSV (EC,TDS,SAL,SG and ?STATUS,...) that can run up to the full
+# buffer, and a short read would silently truncate the payload.
+ATLAS_RESPONSE_LENGTHS = {
+    'I': 24,
+    'Sleep': 2,
+    'T': 2,
+    'Cal': 2,
+}
+
+# EC calibration points classified by value: below 1.0 mS/cm is a low
+# point, below 5.0 a single point, anything higher a high point
+_EC_CAL_BINS = [
+    (1.0, 'low'),
+    (5.0, 'single'),
+    (float('inf'), 'high'),
+]
+
+@lru_cache(maxsize=32)
+def _encode_command(command: str) -> List[int]:
+    """Encode a command string into the byte list sent over I2C
+
+    Cached so fixed commands ('R', 'I', ...) and recently used
+    parametrized ones ('T,25.00') are encoded only once.
+    """
+    return list((command + '\r').encode())
+
 class AtlasInterface:
     """Interface for Atlas Scientific sensors via I2C"""
     
@@ -53,6 +106,12 @@ class AtlasInterface:
             'EC': self.i2c_config.get('ec_address', ATLAS_SENSOR_ADDRESSES['EC']),
             'TEMP': self.i2c_config.get('temp_address', ATLAS_SENSOR_ADDRESSES['TEMP']),
         }
+
+        # Hot-path bindings so per-read code skips the dict lookups
+        self._addr_ph = self.addresses['pH']
+        self._addr_ec = self.addresses['EC']
+        self._addr_temp = self.addresses['TEMP']
+        self._cmd_read = ATLAS_COMMANDS['READ']
         
         # Sensor state
         self.lock = threading.RLock()
@@ -68,6 +127,9 @@ class AtlasInterface:
         
         # Temperature compensation
         self.temp_compensation = 25.0  # Default temperature compensation
+        self._last_tc_time = 0         # When compensation was last written
+        self._tc_delta = 0.3           # Min °C change before rewriting
+        self._tc_min_interval = 60.0   # Min seconds between rewrites
         
         # I2C interface
         self.i2c = None
@@ -78,8 +140,35 @@ class AtlasInterface:
         if not success:
             logger.warning("Failed to initialize I2C. Running in simulation mode.")
             self.simulation_mode = True
-        
+
+        # Background refresher keeps the cache warm so getters normally
+        # return immediately instead of blocking callers on I2C
+        self._stop_refresh = threading.Event()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresh_thread.start()
+
         logger.info("Atlas sensor interface initialized")
+
+    def _refresh_loop(self):
+        """Background loop that keeps sensor readings fresh
+
+        Runs refresh_all() at half the cache interval so web requests
+        hit a warm cache rather than paying I2C latency inline.
+        """
+        interval = max(self.cache_time / 2, 0.5)
+        while not self._stop_refresh.wait(interval):
+            try:
+                self.refresh_all()
+            except Exception as e:
+                logger.error(f"Error in background sensor refresh: {e}")
+
+    def _jittered_ttl(self) -> float:
+        """Cache TTL with ±20% jitter to desynchronize expirations
+
+        Without jitter all four entries expire on the same boundary and
+        sequential getters would stampede into back-to-back refreshes.
+        """
+        return self.cache_time * (1.0 + _RNG.uniform(-0.2, 0.2))
     
     def _init_i2c(self) -> bool:
         """Initialize the I2C interface
@@ -184,20 +273,42 @@ class AtlasInterface:
         """
         try:
             # Send command to device
-            cmd_bytes = command.encode() + b'\r'
-            self.i2c.write_i2c_block_data(address, 0, list(cmd_bytes))
-            
-            # Wait for processing
-            time.sleep(0.3)  # Most commands need ~300ms
-            
-            # Read response (first byte is response length)
-            data = self.i2c.read_i2c_block_data(address, 0, 31)
-            length = data[0]
-            
-            # Convert response to string
-            response = bytearray(data[1:1+length]).decode().rstrip('\0\r')
-            return response
-            
+            self.i2c.write_i2c_block_data(address, 0, _encode_command(command))
+
+            # Poll for the response instead of a fixed 300ms wait.
+            # Most commands finish in well under 100ms; back off
+            # exponentially up to the command-specific deadline.
+            cmd_key = command.split(',')[0]
+            timeout = ATLAS_COMMAND_TIMEOUTS.get(cmd_key, 1.0)
+            resp_len = ATLAS_RESPONSE_LENGTHS.get(cmd_key, 31)
+            deadline = time.monotonic() + timeout
+            delay = 0.02
+
+            while True:
+                time.sleep(delay)
+
+                # Read response (first byte is the Atlas response code)
+                data = self.i2c.read_i2c_block_data(address, 0, resp_len)
+                code = data[0]
+
+                if code == ATLAS_RESPONSE_SUCCESS:
+                    break
+
+                if code in (ATLAS_RESPONSE_BUSY, ATLAS_RESPONSE_NO_DATA):
+                    if time.monotonic() >= deadline:
+                        logger.error(f"Timeout waiting for response (addr: 0x{address:02x}, cmd: {command})")
+                        return None
+                    delay = min(delay * 1.5, 0.1)
+                    continue
+
+                # ATLAS_RESPONSE_ERROR or unexpected code
+                logger.error(f"Sensor error response {code} (addr: 0x{address:02x}, cmd: {command})")
+                return None
+
+            # Convert response to string (Atlas responses are ASCII,
+            # padded with trailing nulls)
+            return bytes(data[1:]).rstrip(b'\x00\r').decode('ascii', 'replace')
+
         except Exception as e:
             logger.error(f"I2C command error (addr: 0x{address:02x}, cmd: {command}): {e}")
             return None
@@ -224,7 +335,7 @@ class AtlasInterface:
             response = self._send_command(address, command)
             
             if response:
-                logger.info(f"Set temperature compensation for {device_type} to {temp:.2f}°C")
+                logger.info("Set temperature compensation for %s to %.2f°C", device_type, temp)
                 return True
             return False
         except Exception as e:
@@ -239,11 +350,10 @@ class AtlasInterface:
         """
         if self.simulation_mode:
             # Simulate pH between 5.5 and 7.0 with some noise
-            return round(6.0 + random.uniform(-0.5, 1.0), 2)
+            return round(6.0 + _RNG.uniform(-0.5, 1.0), 2)
         
         try:
-            address = self.addresses['pH']
-            response = self._send_command(address, ATLAS_COMMANDS['READ'])
+            response = self._send_command(self._addr_ph, self._cmd_read)
             
             if response:
                 return float(response)
@@ -252,56 +362,55 @@ class AtlasInterface:
             logger.error(f"Error reading pH: {e}")
             return None
     
-    def _read_ec(self) -> Optional[float]:
-        """Read EC value from sensor
-        
+    def _read_ec_full(self) -> Optional[Tuple[float, int]]:
+        """Read EC and TDS from the EC sensor in a single command
+
+        The EC sensor response is CSV (EC,TDS,SAL,SG), so both values
+        come from one read instead of a second round-trip for TDS.
+
         Returns:
-            float: EC value in mS/cm or None if error
+            Tuple of (EC in mS/cm, TDS in ppm) or None if error
         """
         if self.simulation_mode:
             # Simulate EC between 1.0 and 2.0 with some noise
-            return round(1.5 + random.uniform(-0.5, 0.5), 2)
-        
+            ec = round(1.5 + _RNG.uniform(-0.5, 0.5), 2)
+            return ec, int(ec * 500)
+
         try:
-            address = self.addresses['EC']
-            response = self._send_command(address, ATLAS_COMMANDS['READ'])
-            
+            response = self._send_command(self._addr_ec, self._cmd_read)
+
             if response:
                 # Parse response - could contain EC,TDS,SAL,SG
                 parts = response.split(',')
-                return float(parts[0])
+                ec = float(parts[0])
+                if len(parts) >= 2:
+                    tds = int(float(parts[1]))
+                else:
+                    # Calculate TDS from EC if not provided
+                    tds = int(ec * 500)  # Approximate conversion
+                return ec, tds
             return None
         except Exception as e:
             logger.error(f"Error reading EC: {e}")
             return None
-    
+
+    def _read_ec(self) -> Optional[float]:
+        """Read EC value from sensor
+
+        Returns:
+            float: EC value in mS/cm or None if error
+        """
+        result = self._read_ec_full()
+        return result[0] if result is not None else None
+
     def _read_tds(self) -> Optional[int]:
         """Read TDS value from EC sensor
-        
+
         Returns:
             int: TDS value in ppm or None if error
         """
-        if self.simulation_mode:
-            # Simulate TDS between 500 and 1000 ppm with some noise
-            return int(750 + random.uniform(-250, 250))
-        
-        try:
-            address = self.addresses['EC']
-            response = self._send_command(address, ATLAS_COMMANDS['READ'])
-            
-            if response:
-                # Parse response - could contain EC,TDS,SAL,SG
-                parts = response.split(',')
-                if len(parts) >= 2:
-                    return int(float(parts[1]))
-                else:
-                    # Calculate TDS from EC if not provided
-                    ec = float(parts[0])
-                    return int(ec * 500)  # Approximate conversion
-            return None
-        except Exception as e:
-            logger.error(f"Error reading TDS: {e}")
-            return None
+        result = self._read_ec_full()
+        return result[1] if result is not None else None
     
     def _read_temperature(self) -> Optional[float]:
         """Read temperature value from sensor
@@ -311,11 +420,10 @@ class AtlasInterface:
         """
         if self.simulation_mode:
             # Simulate temperature between 20 and 25°C with some noise
-            return round(22.5 + random.uniform(-2.5, 2.5), 1)
+            return round(22.5 + _RNG.uniform(-2.5, 2.5), 1)
         
         try:
-            address = self.addresses['TEMP']
-            response = self._send_command(address, ATLAS_COMMANDS['READ'])
+            response = self._send_command(self._addr_temp, self._cmd_read)
             
             if response:
                 return float(response)
@@ -324,107 +432,128 @@ class AtlasInterface:
             logger.error(f"Error reading temperature: {e}")
             return None
     
+    def _update_temperature_compensation_with(self, temp: Optional[float]):
+        """Apply temperature compensation from an already-read value
+
+        Skips the sensor writes when the temperature has not moved by at
+        least _tc_delta and compensation was written recently — the
+        probes don't need recompensation for sub-degree changes, and
+        each write costs an I2C round-trip per sensor.
+        """
+        if temp is None or not 0 < temp < 50:
+            return
+
+        now = time.monotonic()
+        if (abs(temp - self.temp_compensation) < self._tc_delta
+                and now - self._last_tc_time < self._tc_min_interval):
+            return
+
+        self.temp_compensation = temp
+        self._last_tc_time = now
+        self._set_temperature_compensation('pH', temp)
+        self._set_temperature_compensation('EC', temp)
+
     def _update_temperature_compensation(self):
         """Update temperature compensation for pH and EC sensors"""
-        temp = self.get_temperature()
-        if temp is not None and 0 < temp < 50:
-            self.temp_compensation = temp
-            self._set_temperature_compensation('pH', temp)
-            self._set_temperature_compensation('EC', temp)
+        self._update_temperature_compensation_with(self.get_temperature())
     
+    def refresh_all(self):
+        """Refresh all sensor readings in a single batched pass
+
+        Reads temperature once, updates temperature compensation on the
+        pH and EC sensors only if the temperature changed significantly,
+        then reads pH and EC once and derives TDS from EC. All four cache
+        entries are stamped with the same timestamp.
+        """
+        with self.lock:
+            current_time = time.monotonic()
+
+            # Read temperature first so compensation uses a fresh value
+            temp = self._read_temperature()
+            if temp is not None:
+                self.last_readings['TEMP'] = {
+                    'value': temp,
+                    'timestamp': current_time,
+                    'ttl': self._jittered_ttl()
+                }
+
+                # Only rewrite compensation when temperature actually
+                # moved, without re-reading the sensor we just read
+                self._update_temperature_compensation_with(temp)
+
+            # Read pH
+            ph = self._read_ph()
+            if ph is not None:
+                self.last_readings['pH'] = {
+                    'value': ph,
+                    'timestamp': current_time,
+                    'ttl': self._jittered_ttl()
+                }
+
+            # Read EC and TDS together from one command
+            result = self._read_ec_full()
+            if result is not None:
+                ec, tds = result
+                self.last_readings['EC'] = {
+                    'value': ec,
+                    'timestamp': current_time,
+                    'ttl': self._jittered_ttl()
+                }
+                self.last_readings['TDS'] = {
+                    'value': tds,
+                    'timestamp': current_time,
+                    'ttl': self._jittered_ttl()
+                }
+
+    def _get_reading(self, sensor: str):
+        """Return a cached reading, refreshing all sensors if stale
+
+        The cache-hit path is lock-free: refresh_all rebinds each cache
+        entry as a whole dict, so reading one under the GIL is safe. The
+        lock is only taken to refresh, with a re-check in case another
+        thread refreshed while we waited (double-checked caching).
+        """
+        entry = self.last_readings[sensor]
+        if time.monotonic() - entry['timestamp'] <= entry.get('ttl', self.cache_time):
+            return entry['value']
+
+        with self.lock:
+            entry = self.last_readings[sensor]
+            if time.monotonic() - entry['timestamp'] > entry.get('ttl', self.cache_time):
+                self.refresh_all()
+            return self.last_readings[sensor]['value']
+
     def get_ph(self) -> float:
         """Get pH value, reading from sensor if cache has expired
-        
+
         Returns:
             float: pH value
         """
-        with self.lock:
-            current_time = time.time()
-            if current_time - self.last_readings['pH']['timestamp'] > self.cache_time:
-                # Update temperature compensation first
-                self._update_temperature_compensation()
-                
-                # Read new value
-                ph = self._read_ph()
-                if ph is not None:
-                    self.last_readings['pH'] = {
-                        'value': ph,
-                        'timestamp': current_time
-                    }
-            
-            return self.last_readings['pH']['value']
-    
+        return self._get_reading('pH')
+
     def get_ec(self) -> float:
         """Get EC value, reading from sensor if cache has expired
-        
+
         Returns:
             float: EC value in mS/cm
         """
-        with self.lock:
-            current_time = time.time()
-            if current_time - self.last_readings['EC']['timestamp'] > self.cache_time:
-                # Update temperature compensation first
-                self._update_temperature_compensation()
-                
-                # Read new value
-                ec = self._read_ec()
-                if ec is not None:
-                    self.last_readings['EC'] = {
-                        'value': ec,
-                        'timestamp': current_time
-                    }
-            
-            return self.last_readings['EC']['value']
-    
+        return self._get_reading('EC')
+
     def get_tds(self) -> int:
         """Get TDS value, reading from sensor if cache has expired
-        
+
         Returns:
             int: TDS value in ppm
         """
-        with self.lock:
-            current_time = time.time()
-            if current_time - self.last_readings['TDS']['timestamp'] > self.cache_time:
-                # If EC has been recently updated, calculate from EC
-                if current_time - self.last_readings['EC']['timestamp'] <= self.cache_time:
-                    ec = self.last_readings['EC']['value']
-                    tds = int(ec * 500)  # Approximate conversion
-                    self.last_readings['TDS'] = {
-                        'value': tds,
-                        'timestamp': current_time
-                    }
-                else:
-                    # Update temperature compensation first
-                    self._update_temperature_compensation()
-                    
-                    # Read new value
-                    tds = self._read_tds()
-                    if tds is not None:
-                        self.last_readings['TDS'] = {
-                            'value': tds,
-                            'timestamp': current_time
-                        }
-            
-            return self.last_readings['TDS']['value']
-    
+        return self._get_reading('TDS')
+
     def get_temperature(self) -> float:
         """Get temperature value, reading from sensor if cache has expired
-        
+
         Returns:
             float: Temperature in Celsius
         """
-        with self.lock:
-            current_time = time.time()
-            if current_time - self.last_readings['TEMP']['timestamp'] > self.cache_time:
-                # Read new value
-                temp = self._read_temperature()
-                if temp is not None:
-                    self.last_readings['TEMP'] = {
-                        'value': temp,
-                        'timestamp': current_time
-                    }
-            
-            return self.last_readings['TEMP']['value']
+        return self._get_reading('TEMP')
     
     def get_ph_calibration_status(self) -> Dict[str, Any]:
         """Get pH sensor calibration status
@@ -447,22 +576,22 @@ class AtlasInterface:
             if response:
                 # Parse calibration status response
                 # Format is typically: "?STATUS,X,Y,Z" where X,Y,Z are pH values or 0
-                parts = response.strip('?STATUS,').split(',')
-                
+                parts = response.removeprefix('?STATUS,').split(',')
+
+                # Parse each point once and reuse the parsed value
+                values = [(p, float(p)) for p in parts]
+
                 # Convert to meaningful status
                 status = {
-                    'calibrated': any(float(p) > 0 for p in parts),
+                    'calibrated': any(v > 0 for _, v in values),
                 }
-                
+
                 # Add calibration points if available
-                if len(parts) >= 3:
-                    if float(parts[0]) > 0:
-                        status['mid'] = parts[0]
-                    if float(parts[1]) > 0:
-                        status['low'] = parts[1]
-                    if float(parts[2]) > 0:
-                        status['high'] = parts[2]
-                
+                if len(values) >= 3:
+                    for (point, value), name in zip(values, ('mid', 'low', 'high')):
+                        if value > 0:
+                            status[name] = point
+
                 return status
             else:
                 return {'calibrated': False, 'error': 'No response from sensor'}
@@ -491,27 +620,26 @@ class AtlasInterface:
             if response:
                 # Parse calibration status response
                 # Format is typically: "?STATUS,DRY,X,Y,Z" where X,Y,Z are EC values or 0
-                parts = response.strip('?STATUS,').split(',')
-                
+                parts = response.removeprefix('?STATUS,').split(',')
+
+                # Parse each point once and reuse the parsed value
+                values = [(p, float(p)) for p in parts[1:]]
+
                 # Convert to meaningful status
                 status = {
-                    'calibrated': any(p != '0' for p in parts[1:]) or parts[0] == '1',
+                    'calibrated': parts[0] == '1' or any(v != 0.0 for _, v in values),
                 }
-                
+
                 # Add calibration points if available
                 if parts[0] == '1':
                     status['dry'] = True
-                
-                # Add any non-zero calibration points
-                for point in parts[1:]:
-                    if point != '0':
-                        if float(point) < 1.0:
-                            status['low'] = point
-                        elif float(point) < 5.0:
-                            status['single'] = point
-                        else:
-                            status['high'] = point
-                
+
+                # Classify any non-zero calibration points by value
+                for point, value in values:
+                    if value != 0.0:
+                        name = next(n for limit, n in _EC_CAL_BINS if value < limit)
+                        status[name] = point
+
                 return status
             else:
                 return {'calibrated': False, 'error': 'No response from sensor'}
@@ -692,7 +820,10 @@ class AtlasInterface:
     def cleanup(self):
         """Clean up resources before shutdown"""
         logger.info("Cleaning up Atlas interface")
-        
+
+        # Stop the background refresher
+        self._stop_refresh.set()
+
         if self.simulation_mode:
             return
         
@@ -3,11 +3,113 @@
 # Implements smart dosing algorithms for pH and EC/PPM adjustment
 
 import time
+import asyncio
 import logging
 import threading
+from collections import deque
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from enum import IntEnum
 from typing import Dict, Any, Optional, List, Tuple, Callable
 
+@dataclass(slots=True)
+class DoseEvent:
+    """One dosing-history record; slotted, so thousands of retained
+    events cost a fraction of what per-event dicts would."""
+    timestamp: float
+    volume_ml: float
+    reason: str
+    ph_before: Optional[float]
+    ec_before: Optional[float]
+
+@dataclass(slots=True)
+class DilutionResult:
+    """Planned dilution compensation. Stays an object on the hot path;
+    to_dict materializes the API payload only when it crosses out."""
+    nutrient_a_ml: float
+    nutrient_b_ml: float
+    current_ec: float
+    diluted_ec: float
+    target_ec: float
+    added_water_liters: float
+
+    def to_dict(self, round_places: int = 2) -> Dict[str, float]:
+        """Materialize the API payload, rounding for display. The fields
+        themselves stay full precision for the pump drivers."""
+        return {
+            'nutrient_a_ml': round(self.nutrient_a_ml, round_places),
+            'nutrient_b_ml': round(self.nutrient_b_ml, round_places),
+            'current_ec': self.current_ec,
+            'diluted_ec': round(self.diluted_ec, round_places),
+            'target_ec': self.target_ec,
+            'added_water_liters': self.added_water_liters
+        }
+
+class DosingState(IntEnum):
+    """Dosing controller states; int comparisons are cheaper than the
+    string equality the per-cycle checks used to do, and the names still
+    serialize to the old API strings via .name.lower()."""
+    IDLE = 0        # No active dosing
+    PH_UP = 1       # Adding pH up solution
+    PH_DOWN = 2     # Adding pH down solution
+    NUT_A = 3       # Adding nutrient A
+    NUT_B = 4       # Adding nutrient B
+    MEASURING = 5   # Waiting for measurements to stabilize
+    ERROR = 6       # Error state
+
+def _adjustment_factor(deviation: float, band_narrow: float, band_medium: float) -> float:
+    """Map a deviation to its adjustment factor (small/medium/large).
+
+    Branchless: 0.2 inside the narrow band, +0.3 past it, +0.5 past the
+    medium band (0.2 / 0.5 / 1.0).
+    """
+    return 0.2 + 0.3 * (deviation > band_narrow) + 0.5 * (deviation > band_medium)
+
+def _compute_dose_volume(abs_deviation: float, efficiency: float,
+                         volume_ratio: float, max_single_dose: float,
+                         band_narrow: float, band_medium: float) -> float:
+    """Pure numeric kernel for the pH dose-volume calculation.
+
+    Kept free of object attribute access so it can be compiled by numba
+    when available (see below); it is also cheap enough interpreted.
+    """
+    factor = _adjustment_factor(abs_deviation, band_narrow, band_medium)
+    volume = abs_deviation * 10.0 * efficiency * factor * volume_ratio
+    if volume > max_single_dose:
+        volume = max_single_dose
+    return round(volume * 100.0) / 100.0
+
+def _dilution_kernel(added_water, current_ec, reservoir_volume,
+                     dose_eff_a_over_100, ratio_frac_a, ratio_frac_b):
+    """Arithmetic core of the dilution compensation.
+
+    Elementwise, so it works unchanged on scalars and NumPy arrays; the
+    batch planner feeds it whole arrays of candidate top-up volumes.
+
+    The base volume collapses algebraically: with R the reservoir volume
+    and w the added water,
+
+        ec_drop = ec * w / (R + w)
+        base    = ec_drop * (eff / 100) * ((R + w) / 100)
+                = ec * w * (eff / 100) / 100
+
+    so the (R + w) factors cancel and only the diluted EC, returned for
+    display, still needs the division.
+    """
+    diluted_ec = current_ec * (reservoir_volume / (reservoir_volume + added_water))
+    base_volume_ml = current_ec * added_water * dose_eff_a_over_100 * 0.01
+    return base_volume_ml * ratio_frac_a, base_volume_ml * ratio_frac_b, diluted_ec
+
+try:
+    # Compile the numeric kernels when numba is available (optional,
+    # like the hardware libraries elsewhere in the project)
+    from numba import njit
+    _adjustment_factor = njit(cache=True, fastmath=True)(_adjustment_factor)
+    _compute_dose_volume = njit(cache=True, fastmath=True)(_compute_dose_volume)
+    _dilution_kernel = njit(cache=True, fastmath=True)(_dilution_kernel)
+except ImportError:
+    pass
+
 class DosingController:
     """
     Sophisticated dosing controller for hydroponic systems.
@@ -20,14 +122,14 @@ class DosingController:
     - Dilution compensation
     """
     
-    # Dosing states
-    IDLE = 'idle'               # No active dosing
-    DOSING_PH_UP = 'ph_up'      # Adding pH up solution
-    DOSING_PH_DOWN = 'ph_down'  # Adding pH down solution
-    DOSING_NUTRIENT_A = 'nut_a' # Adding nutrient A
-    DOSING_NUTRIENT_B = 'nut_b' # Adding nutrient B
-    MEASURING = 'measuring'     # Waiting for measurements to stabilize
-    ERROR = 'error'             # Error state
+    # Dosing states (aliases keep the existing call sites readable)
+    IDLE = DosingState.IDLE
+    DOSING_PH_UP = DosingState.PH_UP
+    DOSING_PH_DOWN = DosingState.PH_DOWN
+    DOSING_NUTRIENT_A = DosingState.NUT_A
+    DOSING_NUTRIENT_B = DosingState.NUT_B
+    MEASURING = DosingState.MEASURING
+    ERROR = DosingState.ERROR
     
     def __init__(self, 
                  sensor_manager,
@@ -47,13 +149,28 @@ class DosingController:
         self.sensor_manager = sensor_manager
         self.pump_manager = pump_manager
         self.config = config_manager
+
+        # Data-driven pump dispatch: pump type -> bound dosing coroutine
+        self._pump_dispatch: Dict[str, Callable] = {
+            'ph_up': pump_manager.dose_ph_up,
+            'ph_down': pump_manager.dose_ph_down,
+            'nutrient_a': pump_manager.dose_nutrient_a,
+            'nutrient_b': pump_manager.dose_nutrient_b
+        }
         
         # System parameters
         self.reservoir_volume = reservoir_volume_liters
         self.system_state = self.IDLE
         
-        # Lock for thread safety
-        self.lock = threading.RLock()
+        # Lock guarding short mutations of state/history; never held
+        # across awaits or pump I/O
+        self.lock = threading.Lock()
+
+        # Debounced config saves: setters mark the config dirty and a
+        # short timer coalesces a batch of changes into one disk write
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_delay = 0.5  # seconds
         
         # Safety parameters (to be loaded from config)
         self.max_daily_dosage_ml = {
@@ -63,13 +180,21 @@ class DosingController:
             'nutrient_b': 200.0
         }
         
-        # Dosing history for safety limits
+        # Dosing history for safety limits. Ring buffers: sized for
+        # ~7 days at a heavy dose rate, so memory stays bounded even if
+        # periodic trimming never runs.
+        self.history_maxlen = 2048
         self.dosing_history = {
-            'ph_up': [],
-            'ph_down': [],
-            'nutrient_a': [],
-            'nutrient_b': []
+            'ph_up': deque(maxlen=self.history_maxlen),
+            'ph_down': deque(maxlen=self.history_maxlen),
+            'nutrient_a': deque(maxlen=self.history_maxlen),
+            'nutrient_b': deque(maxlen=self.history_maxlen)
         }
+
+        # Rolling 24h window per pump with a running volume sum, so
+        # safety checks don't rescan the full history on every dose
+        self.history_24h = {pump: deque() for pump in self.dosing_history}
+        self.daily_volume_ml = {pump: 0.0 for pump in self.dosing_history}
         
         # Target parameters (to be loaded from config)
         self.target_ph = 6.0
@@ -87,8 +212,29 @@ class DosingController:
         self.ec_band_medium = 150.0  # μS/cm - Use medium doses when within this band
         self.ec_band_wide = 300.0    # μS/cm - Use large doses when outside this band
         
+        # PID control (error memory reaches set-point in fewer dosing
+        # cycles than the band ladder; the ladder remains as a fallback
+        # when 'pid_enabled' is false in the config). Integrals are in
+        # error-units * seconds; the clamp bounds the integral term's
+        # contribution to the output (anti-windup).
+        self.pid_enabled = True
+        self.ph_pid = {
+            'Kp': 0.5, 'Ki': 2e-5, 'Kd': 0.0,
+            'integral': 0.0, 'integral_max': 25000.0,
+            'prev_err': 0.0, 'prev_t': None
+        }
+        self.ec_pid = {
+            'Kp': 0.5, 'Ki': 2e-5, 'Kd': 0.0,
+            'integral': 0.0, 'integral_max': 1.0e7,
+            'prev_err': 0.0, 'prev_t': None
+        }
+
         # Nutrient ratios (to be loaded from config)
         self.nutrient_ratio_a_to_b = 1.0  # 1:1 ratio by default
+
+        # Dose A and B concurrently; set to False in the config for
+        # controllers whose pumps share a driver
+        self.parallel_dose_ab = True
         
         # Dosing ml per unit change (to be calibrated or loaded from config)
         # Example: ml of pH up needed to raise 1L of water by 1.0 pH unit
@@ -119,9 +265,25 @@ class DosingController:
             'any': 0  # Any type of dosing
         }
         
+        # Values derived from config, recomputed on config changes
+        # rather than on every dose
+        self._recompute_derived()
+
         # Initialize from config
         self._load_config()
-        
+
+    def _recompute_derived(self):
+        """Refresh per-dose constants derived from the config."""
+        self._volume_ratio = self.reservoir_volume / 100.0
+        # Max 30% of the daily limit in one dose
+        self._max_single_dose = {k: v * 0.3 for k, v in self.max_daily_dosage_ml.items()}
+        # A/B split fractions and the per-uS/cm efficiency constant used
+        # by the nutrient and dilution formulas
+        ratio_sum = 1.0 + self.nutrient_ratio_a_to_b
+        self._ratio_frac_a = self.nutrient_ratio_a_to_b / ratio_sum
+        self._ratio_frac_b = 1.0 / ratio_sum
+        self._dose_eff_a_over_100 = self.dose_efficiency['nutrient_a'] / 100.0
+
     def _load_config(self):
         """Load dosing configuration from config manager."""
         try:
@@ -138,6 +300,9 @@ class DosingController:
             
             # Nutrient ratios
             self.nutrient_ratio_a_to_b = float(dosing_config.get('nutrient_ratio_a_to_b', self.nutrient_ratio_a_to_b))
+
+            # Concurrent A/B dosing
+            self.parallel_dose_ab = bool(dosing_config.get('parallel_dose_ab', self.parallel_dose_ab))
             
             # Dosing efficiency
             if 'dose_efficiency' in dosing_config:
@@ -147,6 +312,14 @@ class DosingController:
             if 'stabilization_time' in dosing_config:
                 self.stabilization_time.update(dosing_config['stabilization_time'])
                 
+            # PID control (gains only; runtime state stays in memory)
+            self.pid_enabled = bool(dosing_config.get('pid_enabled', self.pid_enabled))
+            for key, pid in (('ph_pid', self.ph_pid), ('ec_pid', self.ec_pid)):
+                gains = dosing_config.get(key, {})
+                for gain in ('Kp', 'Ki', 'Kd', 'integral_max'):
+                    if gain in gains:
+                        pid[gain] = float(gains[gain])
+
             # Dosing interval
             self.dosing_interval = int(dosing_config.get('dosing_interval', self.dosing_interval))
             
@@ -157,6 +330,8 @@ class DosingController:
             
         except Exception as e:
             self.logger.error(f"Error loading dosing configuration: {e}")
+        finally:
+            self._recompute_derived()
     
     def save_config(self):
         """Save current dosing configuration to config manager."""
@@ -168,6 +343,10 @@ class DosingController:
                 'ec_tolerance': self.ec_tolerance,
                 'max_daily_dosage_ml': self.max_daily_dosage_ml,
                 'nutrient_ratio_a_to_b': self.nutrient_ratio_a_to_b,
+                'parallel_dose_ab': self.parallel_dose_ab,
+                'pid_enabled': self.pid_enabled,
+                'ph_pid': {k: self.ph_pid[k] for k in ('Kp', 'Ki', 'Kd', 'integral_max')},
+                'ec_pid': {k: self.ec_pid[k] for k in ('Kp', 'Ki', 'Kd', 'integral_max')},
                 'dose_efficiency': self.dose_efficiency,
                 'stabilization_time': self.stabilization_time,
                 'dosing_interval': self.dosing_interval,
@@ -181,14 +360,37 @@ class DosingController:
         except Exception as e:
             self.logger.error(f"Error saving dosing configuration: {e}")
             return False
-    
+
+    def _schedule_save(self) -> bool:
+        """Mark the config dirty and (re)arm the save timer."""
+        self._dirty = True
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+        self._save_timer = threading.Timer(self._save_delay, self._do_save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+        return True
+
+    def _do_save(self):
+        """Timer callback: write the config if changes are still pending."""
+        if self._dirty:
+            self._dirty = False
+            self.save_config()
+
+    def flush(self):
+        """Write any pending config changes immediately (e.g. at shutdown)."""
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        self._do_save()
+
     def set_target_ph(self, ph: float) -> bool:
         """Set the target pH value."""
         with self.lock:
             if 3.0 <= ph <= 10.0:  # Reasonable pH range
                 self.target_ph = ph
                 self.logger.info(f"Target pH set to {ph}")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid pH target: {ph}")
                 return False
@@ -199,7 +401,7 @@ class DosingController:
             if 0.0 <= ec <= 5000.0:  # Reasonable EC range
                 self.target_ec = ec
                 self.logger.info(f"Target EC set to {ec}")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid EC target: {ec}")
                 return False
@@ -210,7 +412,7 @@ class DosingController:
             if 0.05 <= tolerance <= 1.0:
                 self.ph_tolerance = tolerance
                 self.logger.info(f"pH tolerance set to ±{tolerance}")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid pH tolerance: {tolerance}")
                 return False
@@ -221,7 +423,7 @@ class DosingController:
             if 10.0 <= tolerance <= 500.0:
                 self.ec_tolerance = tolerance
                 self.logger.info(f"EC tolerance set to ±{tolerance}")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid EC tolerance: {tolerance}")
                 return False
@@ -231,8 +433,9 @@ class DosingController:
         with self.lock:
             if volume_liters > 0:
                 self.reservoir_volume = volume_liters
+                self._recompute_derived()
                 self.logger.info(f"Reservoir volume set to {volume_liters} liters")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid reservoir volume: {volume_liters}")
                 return False
@@ -242,135 +445,230 @@ class DosingController:
         with self.lock:
             if 0.1 <= ratio <= 10.0:
                 self.nutrient_ratio_a_to_b = ratio
+                self._recompute_derived()
                 self.logger.info(f"Nutrient A:B ratio set to {ratio}")
-                return self.save_config()
+                return self._schedule_save()
             else:
                 self.logger.error(f"Invalid nutrient ratio: {ratio}")
                 return False
     
     def get_state(self) -> Dict[str, Any]:
-        """Get the current dosing controller state."""
-        with self.lock:
-            return {
-                'state': self.system_state,
-                'target_ph': self.target_ph,
-                'target_ec': self.target_ec,
-                'ph_tolerance': self.ph_tolerance,
-                'ec_tolerance': self.ec_tolerance,
-                'reservoir_volume': self.reservoir_volume,
-                'nutrient_ratio': self.nutrient_ratio_a_to_b,
-                'last_dosing': self.last_dosing_time['any'],
-                'dosing_interval': self.dosing_interval,
-                'next_dosing': self.last_dosing_time['any'] + self.dosing_interval,
-                'dosing_history': self._get_summary_history()
-            }
+        """Get the current dosing controller state.
+
+        Built from plain attribute reads - each is atomic under the GIL
+        and the returned dict is an independent snapshot.
+        """
+        return {
+            'state': self.system_state.name.lower(),
+            'target_ph': self.target_ph,
+            'target_ec': self.target_ec,
+            'ph_tolerance': self.ph_tolerance,
+            'ec_tolerance': self.ec_tolerance,
+            'reservoir_volume': self.reservoir_volume,
+            'nutrient_ratio': self.nutrient_ratio_a_to_b,
+            'last_dosing': self.last_dosing_time['any'],
+            'dosing_interval': self.dosing_interval,
+            'next_dosing': self.last_dosing_time['any'] + self.dosing_interval,
+            'dosing_history': self._get_summary_history()
+        }
     
-    def _get_summary_history(self) -> Dict[str, Any]:
-        """Get a summary of recent dosing history."""
-        now = time.time()
-        last_24h = now - 86400  # 24 hours
-        
+    def _get_summary_history(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Get a summary of recent dosing history.
+
+        O(1) per pump: the rolling 24h window already maintains the
+        total volume and holds entries in time order, so no filtering or
+        re-summing passes are needed.
+        """
+        if now is None:
+            now = time.time()
+
         summary = {}
-        for pump_type, history in self.dosing_history.items():
-            # Filter to last 24 hours
-            recent = [entry for entry in history if entry['timestamp'] >= last_24h]
-            
-            # Calculate total volume used in last 24 hours
-            total_volume = sum(entry['volume_ml'] for entry in recent)
-            
-            # Get most recent dosing event
-            most_recent = max([0] + [entry['timestamp'] for entry in recent]) if recent else 0
-            
-            summary[pump_type] = {
-                'total_24h_ml': total_volume,
-                'count_24h': len(recent),
-                'last_dosing': most_recent,
-                'last_amount_ml': recent[-1]['volume_ml'] if recent else 0
-            }
-        
-        return summary
-    
-    def _clean_old_history(self, days: int = 7):
-        """Remove dosing history older than specified days."""
-        cutoff = time.time() - days * 86400
-        
         with self.lock:
             for pump_type in self.dosing_history:
-                self.dosing_history[pump_type] = [
-                    entry for entry in self.dosing_history[pump_type]
-                    if entry['timestamp'] >= cutoff
-                ]
+                self._expire_24h_window(pump_type, now)
+                window = self.history_24h[pump_type]
+                last = window[-1] if window else None
+
+                summary[pump_type] = {
+                    'total_24h_ml': self.daily_volume_ml[pump_type],
+                    'count_24h': len(window),
+                    'last_dosing': last.timestamp if last else 0,
+                    'last_amount_ml': last.volume_ml if last else 0
+                }
+
+        return summary
     
-    def is_dosing_allowed(self) -> bool:
-        """Check if dosing is allowed based on time and other constraints."""
-        with self.lock:
-            # Prevent dosing if in an active state
-            if self.system_state != self.IDLE:
-                self.logger.debug(f"Dosing not allowed: system in {self.system_state} state")
-                return False
-            
-            # Check if the minimum interval has passed since last dosing
+    def _expire_24h_window(self, pump_type: str, now: float):
+        """Drop entries older than 24h from the rolling window.
+
+        Keeps daily_volume_ml consistent with the window contents so the
+        daily total is a plain lookup rather than a rescan.
+        """
+        window = self.history_24h[pump_type]
+        cutoff = now - 86400
+        while window and window[0].timestamp < cutoff:
+            expired = window.popleft()
+            self.daily_volume_ml[pump_type] -= expired.volume_ml
+    
+    def is_dosing_allowed(self, now: Optional[float] = None) -> bool:
+        """Check if dosing is allowed based on time and other constraints.
+
+        Lock-free: reads a couple of scalar fields that are each atomic
+        under the GIL; the dose methods re-check state under the lock
+        before claiming it.
+        """
+        # Prevent dosing if in an active state
+        if self.system_state != self.IDLE:
+            self.logger.debug(f"Dosing not allowed: system in {self.system_state} state")
+            return False
+        
+        # Check if the minimum interval has passed since last dosing
+        if now is None:
             now = time.time()
-            if now - self.last_dosing_time['any'] < self.dosing_interval:
-                self.logger.debug("Dosing not allowed: minimum interval not elapsed")
-                return False
-            
-            return True
+        if now - self.last_dosing_time['any'] < self.dosing_interval:
+            self.logger.debug("Dosing not allowed: minimum interval not elapsed")
+            return False
+        
+        return True
     
-    def is_pump_within_safety_limits(self, pump_type: str, volume_ml: float) -> bool:
-        """Check if the requested dosing amount is within safety limits."""
+    def is_pump_within_safety_limits(self, pump_type: str, volume_ml: float,
+                                     now: Optional[float] = None,
+                                     cached_limit: Optional[float] = None) -> bool:
+        """Check if the requested dosing amount is within safety limits.
+
+        Callers that already looked up the daily limit can pass it via
+        cached_limit to skip the redundant dict lookup.
+        """
         with self.lock:
             # Check daily limit
-            if pump_type not in self.max_daily_dosage_ml:
-                self.logger.error(f"Unknown pump type: {pump_type}")
-                return False
-            
-            # Calculate amount used in last 24 hours
-            now = time.time()
-            last_24h = now - 86400  # 24 hours
-            
-            history = self.dosing_history.get(pump_type, [])
-            daily_usage = sum(
-                entry['volume_ml'] for entry in history
-                if entry['timestamp'] >= last_24h
-            )
-            
+            if cached_limit is None:
+                if pump_type not in self.max_daily_dosage_ml:
+                    self.logger.error(f"Unknown pump type: {pump_type}")
+                    return False
+                cached_limit = self.max_daily_dosage_ml[pump_type]
+
+            # Amount used in last 24 hours is a running sum
+            self._expire_24h_window(pump_type, now if now is not None else time.time())
+            daily_usage = self.daily_volume_ml[pump_type]
+
             # Check if new dosing would exceed limit
-            if daily_usage + volume_ml > self.max_daily_dosage_ml[pump_type]:
+            if daily_usage + volume_ml > cached_limit:
                 self.logger.warning(
                     f"Safety limit exceeded for {pump_type}: " +
                     f"Used {daily_usage:.2f}ml, requested {volume_ml:.2f}ml, " +
-                    f"limit {self.max_daily_dosage_ml[pump_type]:.2f}ml in 24h"
+                    f"limit {cached_limit:.2f}ml in 24h"
                 )
                 return False
-            
+
             return True
     
-    def _log_dosing_event(self, pump_type: str, volume_ml: float, reason: str):
-        """Log a dosing event to history."""
+    def check_safety_limits(self, volumes: Dict[str, float],
+                            now: Optional[float] = None) -> Optional[str]:
+        """
+        Check several planned doses against the daily limits in one pass.
+
+        Args:
+            volumes: Pump type -> requested volume in ml
+            now: Timestamp for the 24h window cutoff
+
+        Returns:
+            The first pump type that would exceed its limit, or None if
+            all doses are within limits
+        """
+        if now is None:
+            now = time.time()
         with self.lock:
+            limits = self.max_daily_dosage_ml
+            totals = self.daily_volume_ml
+            for pump_type, volume_ml in volumes.items():
+                if pump_type not in limits:
+                    self.logger.error(f"Unknown pump type: {pump_type}")
+                    return pump_type
+                self._expire_24h_window(pump_type, now)
+                if totals[pump_type] + volume_ml > limits[pump_type]:
+                    self.logger.warning(
+                        f"Safety limit exceeded for {pump_type}: " +
+                        f"Used {totals[pump_type]:.2f}ml, requested {volume_ml:.2f}ml, " +
+                        f"limit {limits[pump_type]:.2f}ml in 24h"
+                    )
+                    return pump_type
+            return None
+
+    def _log_dosing_event(self, pump_type: str, volume_ml: float, reason: str,
+                          now: Optional[float] = None):
+        """Log a dosing event to history."""
+        if now is None:
             now = time.time()
-            
-            # Add to dosing history
+        # Only the two control values matter per event; copying the full
+        # readings dict would allocate hundreds of bytes per dose
+        readings = self.sensor_manager.readings
+        ph_before = readings.get('pH')
+        ec_before = readings.get('EC')
+        with self.lock:
+
+            # Add to dosing history and the rolling 24h window
             if pump_type in self.dosing_history:
-                self.dosing_history[pump_type].append({
-                    'timestamp': now,
-                    'volume_ml': volume_ml,
-                    'reason': reason,
-                    'readings_before': self.sensor_manager.readings.copy()
-                })
+                entry = DoseEvent(now, volume_ml, reason, ph_before, ec_before)
+                self.dosing_history[pump_type].append(entry)
+                self._expire_24h_window(pump_type, now)
+                self.history_24h[pump_type].append(entry)
+                self.daily_volume_ml[pump_type] += volume_ml
             
             # Update last dosing time
             self.last_dosing_time[pump_type] = now
             self.last_dosing_time['any'] = now
             
-            # Log the event
-            self.logger.info(f"Dosed {volume_ml:.2f}ml of {pump_type}: {reason}")
-            
-            # Clean old history periodically
-            if len(self.dosing_history[pump_type]) % 10 == 0:
-                self._clean_old_history()
+        # Log the event. No periodic cleanup pass is needed: the history
+        # ring buffers discard their oldest entries on append and the 24h
+        # window self-expires.
+        self.logger.info("Dosed %.2fml of %s: %s", volume_ml, pump_type, reason)
     
+    def _pid_step(self, pid: Dict[str, Any], error: float, now: float,
+                  peek: bool = False) -> float:
+        """
+        Advance a PID controller by one step and return its output.
+
+        Args:
+            pid: PID state dict (self.ph_pid or self.ec_pid)
+            error: Current error (target - measured)
+            now: Current timestamp in seconds
+            peek: Compute the output without committing controller state
+                (used when planning a cycle)
+
+        Returns:
+            Controller output in error units
+        """
+        prev_t = pid['prev_t']
+        dt = 0.0 if prev_t is None else max(now - prev_t, 0.0)
+
+        # Clamped integral (anti-windup); callers additionally unwind it
+        # when the resulting dose is capped
+        i_max = pid['integral_max']
+        integral = pid['integral'] + error * dt
+        integral = max(-i_max, min(i_max, integral))
+
+        derivative = (error - pid['prev_err']) / dt if dt > 0 else 0.0
+
+        if not peek:
+            pid['integral'] = integral
+            pid['prev_err'] = error
+            pid['prev_t'] = now
+
+        return pid['Kp'] * error + pid['Ki'] * integral + pid['Kd'] * derivative
+
+    def _pid_unwind(self, pid: Dict[str, Any], output_excess: float):
+        """
+        Back-calculation anti-windup: bleed the integral by the output
+        excess that a dose cap discarded, so it doesn't keep winding up
+        against a limit the pumps can't deliver.
+
+        Args:
+            pid: PID state dict
+            output_excess: Controller output removed by the clamp
+        """
+        if pid['Ki'] > 0.0 and output_excess != 0.0:
+            pid['integral'] -= output_excess / pid['Ki']
+
     async def dose_ph_adjustment(self) -> Dict[str, Any]:
         """
         Perform pH adjustment dosing if needed.
@@ -378,24 +676,37 @@ class DosingController:
         Returns:
             Dictionary with results of the operation
         """
+        # Fast path: on a stable reservoir the common case is "within
+        # tolerance, do nothing" - check it first, before any lock or
+        # interval bookkeeping (plain reads are atomic under the GIL)
+        current_ph = self.sensor_manager.readings.get('pH')
+        if current_ph is None:
+            return {'success': False, 'message': 'No pH reading available'}
+
+        # Calculate pH deviation
+        ph_deviation = current_ph - self.target_ph
+
+        # Check if pH is within tolerance
+        if abs(ph_deviation) <= self.ph_tolerance:
+            self.logger.debug("pH %s is within tolerance of target %s±%s",
+                              current_ph, self.target_ph, self.ph_tolerance)
+            return {'success': True, 'message': 'pH within tolerance, no dosing needed'}
+
+        # One timestamp per dosing attempt keeps the 24h cutoff
+        # consistent between the safety check and the history log
+        now = time.time()
+
+        # Check if we can dose
+        if not self.is_dosing_allowed(now):
+            return {'success': False, 'message': 'Dosing not allowed at this time'}
+        
+        # Claim the controller under the lock; the dosing itself runs
+        # without it so other threads and tasks aren't blocked while the
+        # pump is awaited
         with self.lock:
-            # Check if we can dose
-            if not self.is_dosing_allowed():
+            if self.system_state != self.IDLE:
                 return {'success': False, 'message': 'Dosing not allowed at this time'}
             
-            # Get current pH reading
-            current_ph = self.sensor_manager.readings.get('pH')
-            if current_ph is None:
-                return {'success': False, 'message': 'No pH reading available'}
-            
-            # Calculate pH deviation
-            ph_deviation = current_ph - self.target_ph
-            
-            # Check if pH is within tolerance
-            if abs(ph_deviation) <= self.ph_tolerance:
-                self.logger.debug(f"pH {current_ph} is within tolerance of target {self.target_ph}±{self.ph_tolerance}")
-                return {'success': True, 'message': 'pH within tolerance, no dosing needed'}
-            
             # Determine which pump to use
             if ph_deviation > 0:  # pH too high, need pH down
                 pump_type = 'ph_down'
@@ -403,84 +714,97 @@ class DosingController:
             else:  # pH too low, need pH up
                 pump_type = 'ph_up'
                 self.system_state = self.DOSING_PH_UP
-            
-            try:
-                # Calculate dosing amount based on deviation
-                abs_deviation = abs(ph_deviation)
-                
-                if abs_deviation <= self.ph_band_narrow:
-                    # Small adjustment
-                    adjustment_factor = 0.2
-                elif abs_deviation <= self.ph_band_medium:
-                    # Medium adjustment
-                    adjustment_factor = 0.5
-                else:
-                    # Large adjustment
-                    adjustment_factor = 1.0
-                
-                # Calculate volume in mL
-                # Formula: deviation * efficiency * adjustment_factor * volume_ratio
-                volume_ml = abs_deviation * 10 * self.dose_efficiency[pump_type] * adjustment_factor * (self.reservoir_volume / 100.0)
-                
-                # Apply maximum single dose limit
-                max_single_dose = self.max_daily_dosage_ml[pump_type] * 0.3  # Max 30% of daily limit in one dose
-                volume_ml = min(volume_ml, max_single_dose)
-                
-                # Round to 2 decimal places for precision
+        
+        try:
+            # Hoist per-pump parameters to locals; each access is
+            # otherwise two attribute loads plus a dict subscript
+            eff = self.dose_efficiency[pump_type]
+            max_daily = self.max_daily_dosage_ml[pump_type]
+            stabilization = self.stabilization_time[pump_type]
+            reservoir_ratio = self._volume_ratio
+
+            # ml of dose per pH unit of controller output
+            gain = 10.0 * eff * reservoir_ratio
+            max_single_dose = self._max_single_dose[pump_type]
+
+            if self.pid_enabled:
+                # PID output in pH units; the integral term trims the
+                # steady-state offset the fixed bands leave behind
+                u = self._pid_step(self.ph_pid, self.target_ph - current_ph, now)
+                volume_ml = abs(u) * gain
+                if volume_ml > max_single_dose:
+                    # Don't let the integral wind up against the dose cap
+                    excess = (volume_ml - max_single_dose) / gain
+                    self._pid_unwind(self.ph_pid, excess if u > 0 else -excess)
+                    volume_ml = max_single_dose
                 volume_ml = round(volume_ml, 2)
-                
-                # Check safety limits
-                if not self.is_pump_within_safety_limits(pump_type, volume_ml):
+            else:
+                # Fallback: banded proportional-only dose
+                volume_ml = _compute_dose_volume(
+                    abs(ph_deviation),
+                    eff,
+                    reservoir_ratio,
+                    max_single_dose,
+                    self.ph_band_narrow,
+                    self.ph_band_medium
+                )
+
+            # Check safety limits
+            if not self.is_pump_within_safety_limits(pump_type, volume_ml, now,
+                                                     cached_limit=max_daily):
+                with self.lock:
                     self.system_state = self.IDLE
-                    return {
-                        'success': False, 
-                        'message': f'Safety limits would be exceeded for {pump_type}'
-                    }
-                
-                # Perform the actual dosing
-                self.logger.info(f"Dosing {volume_ml}ml of {pump_type} for pH adjustment: current {current_ph}, target {self.target_ph}")
-                
-                # Activate the appropriate pump
-                if pump_type == 'ph_up':
-                    success = await self.pump_manager.dose_ph_up(volume_ml)
-                else:  # ph_down
-                    success = await self.pump_manager.dose_ph_down(volume_ml)
+                return {
+                    'success': False, 
+                    'message': f'Safety limits would be exceeded for {pump_type}'
+                }
+            
+            # Perform the actual dosing
+            self.logger.info("Dosing %sml of %s for pH adjustment: current %s, target %s",
+                             volume_ml, pump_type, current_ph, self.target_ph)
+            
+            # Activate the appropriate pump
+            success = await self._pump_dispatch[pump_type](volume_ml)
+            
+            if success:
+                # Log the dosing event
+                reason = f"pH adjustment: {current_ph} → {self.target_ph}"
+                self._log_dosing_event(pump_type, volume_ml, reason, now)
                 
-                if success:
-                    # Log the dosing event
-                    reason = f"pH adjustment: {current_ph} → {self.target_ph}"
-                    self._log_dosing_event(pump_type, volume_ml, reason)
-                    
-                    # Set stabilization waiting period
+                # Set stabilization waiting period
+                with self.lock:
                     self.system_state = self.MEASURING
-                    
-                    # Wait for stabilization (non-blocking, just return)
-                    result = {
-                        'success': True,
-                        'message': f'Dosed {volume_ml}ml of {pump_type} for pH adjustment',
-                        'volume_ml': volume_ml,
-                        'pump_type': pump_type,
-                        'current_ph': current_ph,
-                        'target_ph': self.target_ph,
-                        'stabilization_time': self.stabilization_time[pump_type]
-                    }
-                else:
-                    result = {
-                        'success': False,
-                        'message': f'Pump activation failed for {pump_type}'
-                    }
                 
-                # Reset state after dosing
+                # Wait for stabilization (non-blocking, just return)
+                result = {
+                    'success': True,
+                    'message': f'Dosed {volume_ml}ml of {pump_type} for pH adjustment',
+                    'volume_ml': volume_ml,
+                    'pump_type': pump_type,
+                    'current_ph': current_ph,
+                    'target_ph': self.target_ph,
+                    'stabilization_time': stabilization
+                }
+            else:
+                result = {
+                    'success': False,
+                    'message': f'Pump activation failed for {pump_type}'
+                }
+            
+            # Reset state after dosing
+            with self.lock:
                 self.system_state = self.IDLE
-                return result
-                
-            except Exception as e:
-                self.logger.error(f"Error during pH dosing: {e}")
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Error during pH dosing: {e}")
+            with self.lock:
                 self.system_state = self.ERROR
-                return {'success': False, 'message': f'Error during pH dosing: {str(e)}'}
-            finally:
-                # Ensure we reset state if there was an exception
-                if self.system_state in [self.DOSING_PH_UP, self.DOSING_PH_DOWN]:
+            return {'success': False, 'message': f'Error during pH dosing: {str(e)}'}
+        finally:
+            # Ensure we reset state if there was an exception
+            with self.lock:
+                if DosingState.PH_UP <= self.system_state <= DosingState.PH_DOWN:
                     self.system_state = self.IDLE
     
     async def dose_nutrients(self) -> Dict[str, Any]:
@@ -490,130 +814,260 @@ class DosingController:
         Returns:
             Dictionary with results of the operation
         """
+        # Fast path: on a stable reservoir the common case is "within
+        # tolerance, do nothing" - check it first, before any lock or
+        # interval bookkeeping (plain reads are atomic under the GIL)
+        current_ec = self.sensor_manager.readings.get('EC')
+        if current_ec is None:
+            return {'success': False, 'message': 'No EC reading available'}
+
+        # Calculate EC deviation
+        ec_deviation = self.target_ec - current_ec  # Positive means we need to add nutrients
+
+        # Check if EC is within tolerance
+        if abs(ec_deviation) <= self.ec_tolerance:
+            self.logger.debug("EC %s is within tolerance of target %s±%s",
+                              current_ec, self.target_ec, self.ec_tolerance)
+            return {'success': True, 'message': 'EC within tolerance, no dosing needed'}
+
+        # One timestamp per dosing attempt keeps the 24h cutoff
+        # consistent between the safety checks and the history logs
+        now = time.time()
+
+        # Check if we can dose
+        if not self.is_dosing_allowed(now):
+            return {'success': False, 'message': 'Dosing not allowed at this time'}
+        
+        # Only add nutrients, never remove (dilution must be manual or via auto top-off system)
+        if ec_deviation < 0:
+            self.logger.warning(f"EC {current_ec} is higher than target {self.target_ec}, dilution required")
+            return {'success': False, 'message': 'EC too high, manual dilution required'}
+
+        # Claim the controller under the lock; the dosing itself runs
+        # without it so other threads and tasks aren't blocked while the
+        # pumps are awaited
         with self.lock:
-            # Check if we can dose
-            if not self.is_dosing_allowed():
+            if self.system_state != self.IDLE:
                 return {'success': False, 'message': 'Dosing not allowed at this time'}
+            self.system_state = self.DOSING_NUTRIENT_A
+
+        try:
+            # Hoist per-pump parameters to locals; each access is
+            # otherwise two attribute loads plus a dict subscript
+            max_daily_a = self.max_daily_dosage_ml['nutrient_a']
+            max_daily_b = self.max_daily_dosage_ml['nutrient_b']
+            stabilization_a = self.stabilization_time['nutrient_a']
+
+            # ml of combined nutrient per μS/cm of controller output
+            gain = self._dose_eff_a_over_100 * self._volume_ratio
+
+            if self.pid_enabled:
+                # PID output in μS/cm; nutrients only get added, so
+                # negative outputs dose nothing
+                u = self._pid_step(self.ec_pid, ec_deviation, now)
+                base_volume_ml = max(u, 0.0) * gain
+            else:
+                # Fallback: banded proportional-only dose
+                adjustment_factor = _adjustment_factor(
+                    ec_deviation, self.ec_band_narrow, self.ec_band_medium)
+                base_volume_ml = ec_deviation * adjustment_factor * gain
+
+            # A/B ratio distribution (fractions precomputed on config load)
+            volume_a_ml = base_volume_ml * self._ratio_frac_a
+            volume_b_ml = base_volume_ml * self._ratio_frac_b
+
+            # Round to 2 decimal places for precision
+            volume_a_ml = round(volume_a_ml, 2)
+            volume_b_ml = round(volume_b_ml, 2)
+
+            # Apply maximum single dose limit for each nutrient
+            max_single_dose_a = self._max_single_dose['nutrient_a']
+            max_single_dose_b = self._max_single_dose['nutrient_b']
+            capped_a = min(volume_a_ml, max_single_dose_a)
+            capped_b = min(volume_b_ml, max_single_dose_b)
+            if self.pid_enabled and (capped_a < volume_a_ml or capped_b < volume_b_ml):
+                # Don't let the integral wind up against the dose caps
+                self._pid_unwind(
+                    self.ec_pid,
+                    ((volume_a_ml - capped_a) + (volume_b_ml - capped_b)) / gain)
+            volume_a_ml = capped_a
+            volume_b_ml = capped_b
             
-            # Get current EC reading
-            current_ec = self.sensor_manager.readings.get('EC')
-            if current_ec is None:
-                return {'success': False, 'message': 'No EC reading available'}
-            
-            # Calculate EC deviation
-            ec_deviation = self.target_ec - current_ec  # Positive means we need to add nutrients
-            
-            # Check if EC is within tolerance
-            if abs(ec_deviation) <= self.ec_tolerance:
-                self.logger.debug(f"EC {current_ec} is within tolerance of target {self.target_ec}±{self.ec_tolerance}")
-                return {'success': True, 'message': 'EC within tolerance, no dosing needed'}
-            
-            # Only add nutrients, never remove (dilution must be manual or via auto top-off system)
-            if ec_deviation < 0:
-                self.logger.warning(f"EC {current_ec} is higher than target {self.target_ec}, dilution required")
-                return {'success': False, 'message': 'EC too high, manual dilution required'}
+            # Check both safety limits in one pass over the shared state
+            offending = self.check_safety_limits(
+                {'nutrient_a': volume_a_ml, 'nutrient_b': volume_b_ml}, now)
+            if offending is not None:
+                with self.lock:
+                    self.system_state = self.IDLE
+                return {
+                    'success': False,
+                    'message': f'Safety limits would be exceeded for {offending}'
+                }
             
-            try:
-                # Calculate dosing amount based on deviation
-                if ec_deviation <= self.ec_band_narrow:
-                    # Small adjustment
-                    adjustment_factor = 0.2
-                elif ec_deviation <= self.ec_band_medium:
-                    # Medium adjustment
-                    adjustment_factor = 0.5
-                else:
-                    # Large adjustment
-                    adjustment_factor = 1.0
-                
-                # Volume calculation for each nutrient
-                # Formula: deviation * efficiency * adjustment_factor * volume_ratio
-                base_volume_ml = ec_deviation / 100.0 * self.dose_efficiency['nutrient_a'] * adjustment_factor * (self.reservoir_volume / 100.0)
-                
-                # A/B ratio distribution
-                ratio_sum = 1.0 + self.nutrient_ratio_a_to_b
-                volume_a_ml = base_volume_ml * (self.nutrient_ratio_a_to_b / ratio_sum)
-                volume_b_ml = base_volume_ml * (1.0 / ratio_sum)
-                
-                # Round to 2 decimal places for precision
-                volume_a_ml = round(volume_a_ml, 2)
-                volume_b_ml = round(volume_b_ml, 2)
-                
-                # Apply maximum single dose limit for each nutrient
-                max_single_dose_a = self.max_daily_dosage_ml['nutrient_a'] * 0.3
-                max_single_dose_b = self.max_daily_dosage_ml['nutrient_b'] * 0.3
-                volume_a_ml = min(volume_a_ml, max_single_dose_a)
-                volume_b_ml = min(volume_b_ml, max_single_dose_b)
-                
-                # Check safety limits
-                if not self.is_pump_within_safety_limits('nutrient_a', volume_a_ml):
-                    return {
-                        'success': False, 
-                        'message': 'Safety limits would be exceeded for nutrient A'
-                    }
-                
-                if not self.is_pump_within_safety_limits('nutrient_b', volume_b_ml):
-                    return {
-                        'success': False, 
-                        'message': 'Safety limits would be exceeded for nutrient B'
-                    }
-                
-                # Perform the actual dosing - Nutrient A first
-                self.logger.info(f"Dosing {volume_a_ml}ml of nutrient A for EC adjustment: current {current_ec}, target {self.target_ec}")
-                self.system_state = self.DOSING_NUTRIENT_A
-                
-                success_a = await self.pump_manager.dose_nutrient_a(volume_a_ml)
-                
+            # Perform the actual dosing - A and B run on independent
+            # pumps, so dose them concurrently
+            self.logger.info("Dosing %sml of nutrient A and %sml of nutrient B for EC adjustment: current %s, target %s",
+                             volume_a_ml, volume_b_ml, current_ec, self.target_ec)
+
+            if self.parallel_dose_ab:
+                success_a, success_b = await asyncio.gather(
+                    self._pump_dispatch['nutrient_a'](volume_a_ml),
+                    self._pump_dispatch['nutrient_b'](volume_b_ml)
+                )
+            else:
+                # Sequential fallback for shared pump drivers
+                success_a = await self._pump_dispatch['nutrient_a'](volume_a_ml)
+                success_b = False
                 if success_a:
-                    # Log the dosing event for nutrient A
-                    reason = f"EC adjustment: {current_ec} → {self.target_ec}"
-                    self._log_dosing_event('nutrient_a', volume_a_ml, reason)
-                    
-                    # Now dose nutrient B
-                    self.logger.info(f"Dosing {volume_b_ml}ml of nutrient B for EC adjustment")
-                    self.system_state = self.DOSING_NUTRIENT_B
-                    
-                    success_b = await self.pump_manager.dose_nutrient_b(volume_b_ml)
-                    
-                    if success_b:
-                        # Log the dosing event for nutrient B
-                        self._log_dosing_event('nutrient_b', volume_b_ml, reason)
-                        
-                        # Set measuring state
-                        self.system_state = self.MEASURING
-                        
-                        result = {
-                            'success': True,
-                            'message': f'Dosed nutrients for EC adjustment',
-                            'volume_a_ml': volume_a_ml,
-                            'volume_b_ml': volume_b_ml,
-                            'current_ec': current_ec,
-                            'target_ec': self.target_ec,
-                            'stabilization_time': self.stabilization_time['nutrient_a']  # Use longer of the two
-                        }
-                    else:
-                        result = {
-                            'success': False,
-                            'message': 'Pump activation failed for nutrient B'
-                        }
-                else:
-                    result = {
-                        'success': False,
-                        'message': 'Pump activation failed for nutrient A'
-                    }
-                
-                # Reset state after dosing
+                    with self.lock:
+                        self.system_state = self.DOSING_NUTRIENT_B
+                    success_b = await self._pump_dispatch['nutrient_b'](volume_b_ml)
+
+            # Log whichever doses actually went in
+            reason = f"EC adjustment: {current_ec} → {self.target_ec}"
+            if success_a:
+                self._log_dosing_event('nutrient_a', volume_a_ml, reason, now)
+            if success_b:
+                self._log_dosing_event('nutrient_b', volume_b_ml, reason, now)
+
+            if success_a and success_b:
+                # Set measuring state
+                with self.lock:
+                    self.system_state = self.MEASURING
+
+                result = {
+                    'success': True,
+                    'message': f'Dosed nutrients for EC adjustment',
+                    'volume_a_ml': volume_a_ml,
+                    'volume_b_ml': volume_b_ml,
+                    'current_ec': current_ec,
+                    'target_ec': self.target_ec,
+                    'stabilization_time': stabilization_a  # Use longer of the two
+                }
+            elif not success_a:
+                result = {
+                    'success': False,
+                    'message': 'Pump activation failed for nutrient A'
+                }
+            else:
+                result = {
+                    'success': False,
+                    'message': 'Pump activation failed for nutrient B'
+                }
+            
+            # Reset state after dosing
+            with self.lock:
                 self.system_state = self.IDLE
-                return result
-                
-            except Exception as e:
-                self.logger.error(f"Error during nutrient dosing: {e}")
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Error during nutrient dosing: {e}")
+            with self.lock:
                 self.system_state = self.ERROR
-                return {'success': False, 'message': f'Error during nutrient dosing: {str(e)}'}
-            finally:
-                # Ensure we reset state if there was an exception
-                if self.system_state in [self.DOSING_NUTRIENT_A, self.DOSING_NUTRIENT_B]:
+            return {'success': False, 'message': f'Error during nutrient dosing: {str(e)}'}
+        finally:
+            # Ensure we reset state if there was an exception
+            with self.lock:
+                if DosingState.NUT_A <= self.system_state <= DosingState.NUT_B:
                     self.system_state = self.IDLE
-    
+
+    async def _await_stable(self, key: str, eps: float, timeout: float,
+                            poll_interval: float = 5.0) -> Optional[float]:
+        """
+        Wait for a sensor reading to stabilize, with early exit.
+
+        Polls the sensor and returns as soon as two consecutive readings
+        agree within eps, so a dose that mixes in quickly doesn't sit out
+        the full worst-case stabilization time.
+
+        Args:
+            key: Reading key ('pH', 'EC', ...)
+            eps: Max difference between consecutive readings to call stable
+            timeout: Give up after this many seconds
+            poll_interval: Seconds between polls
+
+        Returns:
+            The last reading, or None if none was available
+        """
+        self.sensor_manager.read_all()
+        prev = self.sensor_manager.readings.get(key)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            self.sensor_manager.read_all()
+            cur = self.sensor_manager.readings.get(key)
+            if cur is not None and prev is not None and abs(cur - prev) < eps:
+                return cur
+            prev = cur
+        return prev
+
+    def _plan_cycle(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Plan a full dosing cycle from current readings without actuating.
+
+        Computes the pH and nutrient volumes the cycle would dose and
+        runs every safety check up front, so a cycle never doses pH only
+        to discover the nutrient dose would be refused - which would
+        leave the reservoir half-adjusted for a whole stabilization wait.
+
+        Returns:
+            Plan dict: 'ok', 'reason' and the planned per-step volumes.
+        """
+        if now is None:
+            now = time.time()
+        plan = {'ok': True, 'reason': '', 'ph': None, 'nutrients': None}
+        readings = self.sensor_manager.readings
+
+        # pH step
+        current_ph = readings.get('pH')
+        if current_ph is not None and abs(current_ph - self.target_ph) > self.ph_tolerance:
+            pump_type = 'ph_down' if current_ph > self.target_ph else 'ph_up'
+            max_single_dose = self._max_single_dose[pump_type]
+            if self.pid_enabled:
+                u = self._pid_step(self.ph_pid, self.target_ph - current_ph, now, peek=True)
+                gain = 10.0 * self.dose_efficiency[pump_type] * self._volume_ratio
+                volume_ml = round(min(abs(u) * gain, max_single_dose), 2)
+            else:
+                volume_ml = _compute_dose_volume(
+                    abs(current_ph - self.target_ph),
+                    self.dose_efficiency[pump_type],
+                    self._volume_ratio,
+                    max_single_dose,
+                    self.ph_band_narrow,
+                    self.ph_band_medium
+                )
+            if not self.is_pump_within_safety_limits(pump_type, volume_ml, now):
+                plan['ok'] = False
+                plan['reason'] = f'Safety limits would be exceeded for {pump_type}'
+                return plan
+            plan['ph'] = {'pump_type': pump_type, 'volume_ml': volume_ml}
+
+        # Nutrient step
+        current_ec = readings.get('EC')
+        if current_ec is not None:
+            ec_deviation = self.target_ec - current_ec
+            if ec_deviation > self.ec_tolerance:
+                gain = self._dose_eff_a_over_100 * self._volume_ratio
+                if self.pid_enabled:
+                    u = self._pid_step(self.ec_pid, ec_deviation, now, peek=True)
+                    base_volume_ml = max(u, 0.0) * gain
+                else:
+                    base_volume_ml = ec_deviation * _adjustment_factor(
+                        ec_deviation, self.ec_band_narrow, self.ec_band_medium) * gain
+                volume_a_ml = min(round(base_volume_ml * self._ratio_frac_a, 2),
+                                  self._max_single_dose['nutrient_a'])
+                volume_b_ml = min(round(base_volume_ml * self._ratio_frac_b, 2),
+                                  self._max_single_dose['nutrient_b'])
+                offending = self.check_safety_limits(
+                    {'nutrient_a': volume_a_ml, 'nutrient_b': volume_b_ml}, now)
+                if offending is not None:
+                    plan['ok'] = False
+                    plan['reason'] = f'Safety limits would be exceeded for {offending}'
+                    return plan
+                plan['nutrients'] = {'volume_a_ml': volume_a_ml, 'volume_b_ml': volume_b_ml}
+
+        return plan
+
     async def run_dosing_cycle(self) -> Dict[str, Any]:
         """
         Run a complete dosing cycle (pH and nutrients).
@@ -635,30 +1089,36 @@ class DosingController:
         
         # Get fresh sensor readings
         self.sensor_manager.read_all()
-        
+
+        # Plan the whole cycle first: if any step would be refused by the
+        # safety limits, abort before actuating anything
+        plan = self._plan_cycle(results['timestamp'])
+        if not plan['ok']:
+            results['message'] = plan['reason']
+            return results
+
         # Step 1: Do pH adjustment first
         ph_result = await self.dose_ph_adjustment()
         results['ph_dosing'] = ph_result
         
-        # If pH dosing was done, wait for stabilization before proceeding to nutrients
+        # If pH dosing was done, wait for stabilization before proceeding
+        # to nutrients, exiting early once the reading settles
         if ph_result.get('success', False) and 'stabilization_time' in ph_result:
-            # In a real implementation, you might want to make this a background task
-            # that waits for stabilization and then proceeds
-            self.logger.info(f"Waiting for pH stabilization: {ph_result['stabilization_time']} seconds")
-            
-            # In a real async implementation, you might use:
-            # await asyncio.sleep(ph_result['stabilization_time'])
-            
-            # Get fresh readings after stabilization
-            self.sensor_manager.read_all()
-        
+            self.logger.info(f"Waiting for pH stabilization: up to {ph_result['stabilization_time']} seconds")
+            await self._await_stable('pH', 0.02, ph_result['stabilization_time'])
+
         # Step 2: Do nutrient/EC adjustment
         nutrient_result = await self.dose_nutrients()
         results['nutrient_dosing'] = nutrient_result
-        
+
+        # Let the EC reading settle too before the cycle reports back
+        if nutrient_result.get('success', False) and 'stabilization_time' in nutrient_result:
+            self.logger.info(f"Waiting for EC stabilization: up to {nutrient_result['stabilization_time']} seconds")
+            await self._await_stable('EC', 5.0, nutrient_result['stabilization_time'])
+
         # Determine overall success
         results['overall_success'] = (
-            ph_result.get('success', False) or 
+            ph_result.get('success', False) or
             nutrient_result.get('success', False)
         )
         
@@ -669,7 +1129,7 @@ class DosingController:
         
         return results
     
-    def calculate_dilution_compensation(self, added_water_liters: float) -> Dict[str, float]:
+    def calculate_dilution_compensation(self, added_water_liters: float) -> Optional[DilutionResult]:
         """
         Calculate nutrient amounts needed to compensate for dilution when adding water.
         
@@ -677,40 +1137,62 @@ class DosingController:
             added_water_liters: Amount of fresh water added in liters
             
         Returns:
-            Dictionary with recommended nutrient amounts
+            DilutionResult with recommended nutrient amounts, or None if
+            no EC reading is available
         """
         # Get current EC
         current_ec = self.sensor_manager.readings.get('EC')
         if current_ec is None:
-            return {'error': 'No EC reading available'}
-        
-        # Calculate new reservoir volume
-        new_volume = self.reservoir_volume + added_water_liters
-        
-        # Calculate EC after dilution (before compensation)
-        diluted_ec = current_ec * (self.reservoir_volume / new_volume)
-        
-        # Calculate EC drop due to dilution
-        ec_drop = current_ec - diluted_ec
+            return None
         
-        # Calculate compensation amounts using the same formula from dose_nutrients
-        # but based on the EC drop instead of deviation
-        base_volume_ml = ec_drop / 100.0 * self.dose_efficiency['nutrient_a'] * (new_volume / 100.0)
-        
-        # A/B ratio distribution
-        ratio_sum = 1.0 + self.nutrient_ratio_a_to_b
-        volume_a_ml = base_volume_ml * (self.nutrient_ratio_a_to_b / ratio_sum)
-        volume_b_ml = base_volume_ml * (1.0 / ratio_sum)
+        # Same arithmetic the batch planner uses; the kernel computes
+        # the diluted EC and the A/B volumes from the EC drop
+        volume_a_ml, volume_b_ml, diluted_ec = _dilution_kernel(
+            added_water_liters, current_ec, self.reservoir_volume,
+            self._dose_eff_a_over_100, self._ratio_frac_a, self._ratio_frac_b)
         
+        # Full precision; rounding happens only at the API boundary so
+        # repeated doses don't accumulate a systematic rounding bias
+        return DilutionResult(
+            nutrient_a_ml=volume_a_ml,
+            nutrient_b_ml=volume_b_ml,
+            current_ec=current_ec,
+            diluted_ec=diluted_ec,
+            target_ec=self.target_ec,
+            added_water_liters=added_water_liters
+        )
+    
+    def calculate_dilution_compensation_batch(self, added_water_liters_array) -> Optional[Dict[str, Any]]:
+        """
+        Plan dilution compensation for many candidate top-up volumes at once.
+
+        Useful for planners/simulators that sweep top-up amounts; the
+        arithmetic runs vectorized over NumPy arrays (and JIT-compiled
+        when numba is installed) instead of looping the scalar method.
+
+        Args:
+            added_water_liters_array: Sequence of top-up volumes in liters
+
+        Returns:
+            Dict of NumPy arrays ('nutrient_a_ml', 'nutrient_b_ml',
+            'diluted_ec'), or None if no EC reading is available
+        """
+        import numpy as np
+
+        current_ec = self.sensor_manager.readings.get('EC')
+        if current_ec is None:
+            return None
+
+        added_water = np.asarray(added_water_liters_array, dtype=np.float64)
+        volume_a_ml, volume_b_ml, diluted_ec = _dilution_kernel(
+            added_water, current_ec, self.reservoir_volume,
+            self._dose_eff_a_over_100, self._ratio_frac_a, self._ratio_frac_b)
         return {
-            'nutrient_a_ml': round(volume_a_ml, 2),
-            'nutrient_b_ml': round(volume_b_ml, 2),
-            'current_ec': current_ec,
-            'diluted_ec': round(diluted_ec, 2),
-            'target_ec': self.target_ec,
-            'added_water_liters': added_water_liters
+            'nutrient_a_ml': volume_a_ml,
+            'nutrient_b_ml': volume_b_ml,
+            'diluted_ec': diluted_ec
         }
-    
+
     async def compensate_for_dilution(self, added_water_liters: float) -> Dict[str, Any]:
         """
         Add nutrients to compensate for dilution after adding water.
@@ -721,102 +1203,126 @@ class DosingController:
         Returns:
             Dictionary with results of the operation
         """
+        # Check if we can dose
+        if not self.is_dosing_allowed():
+            return {'success': False, 'message': 'Dosing not allowed at this time'}
+        
+        # Calculate required nutrients
+        compensation = self.calculate_dilution_compensation(added_water_liters)
+
+        if compensation is None:
+            return {'success': False, 'message': 'No EC reading available'}
+
+        volume_a_ml = compensation.nutrient_a_ml
+        volume_b_ml = compensation.nutrient_b_ml
+        
+        # Check both safety limits in one pass over the shared state
+        offending = self.check_safety_limits(
+            {'nutrient_a': volume_a_ml, 'nutrient_b': volume_b_ml})
+        if offending is not None:
+            return {
+                'success': False,
+                'message': f'Safety limits would be exceeded for {offending}'
+            }
+        
+        # Claim the controller under the lock; the dosing itself runs
+        # without it so other threads and tasks aren't blocked while the
+        # pumps are awaited
         with self.lock:
-            # Check if we can dose
-            if not self.is_dosing_allowed():
+            if self.system_state != self.IDLE:
                 return {'success': False, 'message': 'Dosing not allowed at this time'}
-            
-            # Calculate required nutrients
-            compensation = self.calculate_dilution_compensation(added_water_liters)
-            
-            if 'error' in compensation:
-                return {'success': False, 'message': compensation['error']}
-            
-            volume_a_ml = compensation['nutrient_a_ml']
-            volume_b_ml = compensation['nutrient_b_ml']
-            
-            # Check safety limits
-            if not self.is_pump_within_safety_limits('nutrient_a', volume_a_ml):
-                return {
-                    'success': False, 
-                    'message': 'Safety limits would be exceeded for nutrient A'
-                }
-            
-            if not self.is_pump_within_safety_limits('nutrient_b', volume_b_ml):
-                return {
-                    'success': False, 
-                    'message': 'Safety limits would be exceeded for nutrient B'
-                }
-            
-            try:
-                # Update reservoir volume first
+            self.system_state = self.DOSING_NUTRIENT_A
+        
+        try:
+            # Update reservoir volume first (under the lock so the
+            # derived constants stay consistent for concurrent readers)
+            with self.lock:
                 old_volume = self.reservoir_volume
                 self.reservoir_volume = old_volume + added_water_liters
-                self.save_config()
-                
-                # Perform the dosing - Nutrient A first
+                self._recompute_derived()
+            # Deferred write: back-to-back compensations coalesce into
+            # one disk write instead of blocking here before the doses
+            self._schedule_save()
+            
+            # Perform the dosing; A and B run concurrently when the
+            # pumps have independent drivers
+            if self.logger.isEnabledFor(logging.INFO):
                 self.logger.info(
-                    f"Dosing {volume_a_ml}ml of nutrient A for dilution compensation: " +
-                    f"Added {added_water_liters}L water, EC impact {compensation['current_ec']} → {compensation['diluted_ec']}"
+                    "Dosing %.2fml of nutrient A and %.2fml of nutrient B "
+                    "for dilution compensation: Added %sL water, EC impact %s → %.2f",
+                    volume_a_ml, volume_b_ml, added_water_liters,
+                    compensation.current_ec, compensation.diluted_ec
                 )
-                self.system_state = self.DOSING_NUTRIENT_A
-                
-                success_a = await self.pump_manager.dose_nutrient_a(volume_a_ml)
-                
+
+            if self.parallel_dose_ab:
+                success_a, success_b = await asyncio.gather(
+                    self._pump_dispatch['nutrient_a'](volume_a_ml),
+                    self._pump_dispatch['nutrient_b'](volume_b_ml)
+                )
+            else:
+                # Sequential fallback for shared pump drivers
+                success_a = await self._pump_dispatch['nutrient_a'](volume_a_ml)
+                success_b = False
                 if success_a:
-                    # Log the dosing event for nutrient A
-                    reason = f"Dilution compensation: Added {added_water_liters}L water"
-                    self._log_dosing_event('nutrient_a', volume_a_ml, reason)
-                    
-                    # Now dose nutrient B
-                    self.logger.info(f"Dosing {volume_b_ml}ml of nutrient B for dilution compensation")
-                    self.system_state = self.DOSING_NUTRIENT_B
-                    
-                    success_b = await self.pump_manager.dose_nutrient_b(volume_b_ml)
-                    
-                    if success_b:
-                        # Log the dosing event for nutrient B
-                        self._log_dosing_event('nutrient_b', volume_b_ml, reason)
-                        
-                        # Set measuring state
-                        self.system_state = self.MEASURING
-                        
-                        result = {
-                            'success': True,
-                            'message': f'Dosed nutrients for dilution compensation',
-                            'volume_a_ml': volume_a_ml,
-                            'volume_b_ml': volume_b_ml,
-                            'added_water_liters': added_water_liters,
-                            'new_reservoir_volume': self.reservoir_volume,
-                            'current_ec': compensation['current_ec'],
-                            'diluted_ec': compensation['diluted_ec'],
-                            'target_ec': self.target_ec,
-                            'stabilization_time': self.stabilization_time['nutrient_a']
-                        }
-                    else:
-                        result = {
-                            'success': False,
-                            'message': 'Pump activation failed for nutrient B'
-                        }
-                else:
-                    result = {
-                        'success': False,
-                        'message': 'Pump activation failed for nutrient A'
-                    }
-                
-                # Reset state after dosing
+                    with self.lock:
+                        self.system_state = self.DOSING_NUTRIENT_B
+                    success_b = await self._pump_dispatch['nutrient_b'](volume_b_ml)
+
+            # Log whichever doses actually went in
+            reason = f"Dilution compensation: Added {added_water_liters}L water"
+            if success_a:
+                self._log_dosing_event('nutrient_a', volume_a_ml, reason)
+            if success_b:
+                self._log_dosing_event('nutrient_b', volume_b_ml, reason)
+
+            if success_a and success_b:
+                # Set measuring state
+                with self.lock:
+                    self.system_state = self.MEASURING
+
+                result = {
+                    'success': True,
+                    'message': f'Dosed nutrients for dilution compensation',
+                    'volume_a_ml': round(volume_a_ml, 2),
+                    'volume_b_ml': round(volume_b_ml, 2),
+                    'added_water_liters': added_water_liters,
+                    'new_reservoir_volume': self.reservoir_volume,
+                    'current_ec': compensation.current_ec,
+                    'diluted_ec': round(compensation.diluted_ec, 2),
+                    'target_ec': self.target_ec,
+                    'stabilization_time': self.stabilization_time['nutrient_a']
+                }
+            elif not success_a:
+                result = {
+                    'success': False,
+                    'message': 'Pump activation failed for nutrient A'
+                }
+            else:
+                result = {
+                    'success': False,
+                    'message': 'Pump activation failed for nutrient B'
+                }
+            
+            # Reset state after dosing
+            with self.lock:
                 self.system_state = self.IDLE
-                return result
-                
-            except Exception as e:
-                self.logger.error(f"Error during dilution compensation: {e}")
-                self.system_state = self.ERROR
-                return {'success': False, 'message': f'Error during dilution compensation: {str(e)}'}
-            finally:
-                # Ensure we reset state if there was an exception
-                if self.system_state in [self.DOSING_NUTRIENT_A, self.DOSING_NUTRIENT_B]:
+            return result
+            
+        except asyncio.CancelledError:
+            # Cancellation mid-dose: release the claimed state and let
+            # the cancellation propagate
+            with self.lock:
+                if DosingState.NUT_A <= self.system_state <= DosingState.NUT_B:
                     self.system_state = self.IDLE
-                    
+            raise
+        except Exception as e:
+            self.logger.error(f"Error during dilution compensation: {e}")
+            with self.lock:
+                self.system_state = self.ERROR
+            # Persist the new reservoir volume right away on errors
+            self.flush()
+            return {'success': False, 'message': f'Error during dilution compensation: {str(e)}'}
+
 # For testing
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
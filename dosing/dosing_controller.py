@@ -3,18 +3,76 @@
 NuTetra Hydroponic System - Dosing Controller
 Handles automated pH and nutrient dosing based on sensor readings
 """
+import re
 import time
 import logging
 import threading
 import datetime
 import random
+from collections import deque
+from dataclasses import dataclass
 from typing import Dict, Any, Optional, Tuple, List
 
 logger = logging.getLogger("NuTetra.Dosing")
 
+# Compiled once at import: matches a 24-hour HH:MM string, capturing the
+# hour and minute so callers can parse without strptime
+_HHMM_MATCH = re.compile(r'\A([01]\d|2[0-3]):([0-5]\d)\Z').match
+
+
+@dataclass(slots=True)
+class PumpParams:
+    """Per-pump dosing parameters
+
+    Attributes:
+        rate: Pump flow rate in ml/sec
+        max_dose: Maximum single dose in ml
+        max_daily: Maximum total daily dose in ml
+    """
+    rate: float
+    max_dose: float
+    max_daily: float
+
 class DosingController:
     """Controls automated dosing of pH and nutrients based on sensor readings"""
-    
+
+    # Pumps this controller may drive
+    _VALID_PUMPS = frozenset({'ph_up', 'ph_down', 'nutrient_a', 'nutrient_b'})
+
+    # Validation schema: key -> (min, max, converter). 'time' means an
+    # HH:MM string; bool fields have no range.
+    _SETTINGS_SCHEMA = {
+        'target_ph': (4.0, 9.0, float),
+        'ph_tolerance': (0.1, 1.0, float),
+        'target_ec': (0.1, 5.0, float),
+        'ec_tolerance': (0.1, 1.0, float),
+        'ph_up_rate': (0.1, 10.0, float),
+        'ph_down_rate': (0.1, 10.0, float),
+        'nutrient_a_rate': (0.1, 10.0, float),
+        'nutrient_b_rate': (0.1, 10.0, float),
+        'max_ph_adjustment': (1.0, 100.0, float),
+        'max_nutrient_dose': (1.0, 100.0, float),
+        'max_daily_ph_up': (10.0, 1000.0, float),
+        'max_daily_ph_down': (10.0, 1000.0, float),
+        'max_daily_nutrient': (10.0, 1000.0, float),
+        'dosing_frequency': (5, 1440, int),     # minutes
+        'dosing_cooldown': (1, 120, int),       # minutes
+        'mixing_time': (5, 300, int),           # seconds
+        'nutrient_ab_pause': (0, 300, int),     # seconds
+        'enable_night_mode': (None, None, bool),
+        'night_start': (None, None, 'time'),
+        'night_end': (None, None, 'time'),
+    }
+
+    # Which schema keys each update_* method accepts
+    _TARGET_KEYS = ('target_ph', 'ph_tolerance', 'target_ec', 'ec_tolerance')
+    _NUTRIENT_KEYS = ('ph_up_rate', 'ph_down_rate', 'nutrient_a_rate',
+                      'nutrient_b_rate', 'max_ph_adjustment', 'max_nutrient_dose')
+    _SAFETY_KEYS = ('max_daily_ph_up', 'max_daily_ph_down', 'max_daily_nutrient',
+                    'dosing_frequency', 'dosing_cooldown', 'mixing_time',
+                    'nutrient_ab_pause', 'enable_night_mode', 'night_start',
+                    'night_end')
+
     def __init__(self, config_manager, atlas=None, pumps=None):
         """Initialize the dosing controller
         
@@ -34,22 +92,47 @@ class DosingController:
         
         # Get dosing settings from config
         self.settings = self.config_manager.get_setting('dosing', {})
-        
+
+        # Coalesced config saves (avoid one full file rewrite per settings field)
+        self._config_dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()
+        self._save_delay = 2.0  # seconds
+
         # Set default settings if not in config
         self._set_default_settings()
         
+        # Guards settings, daily_totals, pump params and schedule fields,
+        # which are shared between the dosing thread and web threads
+        self._state_lock = threading.RLock()
+
         # Setup state variables
         self.running = False
         self.active_pump = None
         self.last_run = 0
         self.next_run = 0
         self.dosing_thread = None
+        self._stop_event = threading.Event()
+        # Wakes the scheduler without stopping it (settings/manual-dose changes)
+        self._wakeup = threading.Event()
+
+        # Cached sensor snapshot so UI status polls don't block on probe reads
+        self._sensor_cache = {'ph': None, 'ec': None, 'tds': None,
+                              'temperature': None, 'ts': 0.0}
+        self._sensor_cache_lock = threading.Lock()
+        self._sensor_cache_ttl = 5.0  # seconds
         self.daily_totals = {
             'ph_up': {'daily_total': 0, 'last_reset': time.time()},
             'ph_down': {'daily_total': 0, 'last_reset': time.time()},
             'nutrient_a': {'daily_total': 0, 'last_reset': time.time()},
             'nutrient_b': {'daily_total': 0, 'last_reset': time.time()}
         }
+        # Earliest pending reset; lets _check_daily_reset exit on one compare
+        self._next_reset_due = min(
+            h['last_reset'] for h in self.daily_totals.values()) + 86400.0
+
+        # Recent dose events; maxlen drops the oldest entry in O(1)
+        self.dosing_history = deque(maxlen=100)
         
         logger.info("Dosing controller initialized")
     
@@ -63,6 +146,7 @@ class DosingController:
             'dosing_frequency': 60,  # minutes
             'dosing_cooldown': 15,   # minutes
             'mixing_time': 30,       # seconds
+            'nutrient_ab_pause': 2,  # seconds between nutrient A and B doses
             'enable_night_mode': False,
             'night_start': '22:00',
             'night_end': '06:00',
@@ -77,15 +161,112 @@ class DosingController:
             'max_daily_nutrient': 200 # ml
         }
         
-        # Update settings with defaults for any missing values
-        for key, value in defaults.items():
-            if key not in self.settings:
-                self.settings[key] = value
-        
-        # Save settings to config
-        self.config_manager.set_setting('dosing', self.settings)
-        self.config_manager.save_config()
-    
+        # Merge in defaults for any missing keys (user values win) and
+        # persist only when a default was actually injected
+        missing = defaults.keys() - self.settings.keys()
+        if missing:
+            self.settings = {**defaults, **self.settings}
+            self.config_manager.set_setting('dosing', self.settings)
+            self.config_manager.save_config()
+
+        # Cache the parsed night-mode times
+        self._cache_night_times()
+
+        # Build the per-pump parameter table and cached scalar settings
+        self._rebuild_pump_params()
+        self._refresh_cached_settings()
+
+    def _refresh_cached_settings(self):
+        """Materialize hot-path scalar settings as typed attributes
+
+        The calculators and dose paths read these every call; a plain
+        attribute read is cheaper than a keyed settings.get(), and the
+        float()/int() coercion happens once here rather than per use.
+        """
+        s = self.settings
+        self._target_ph = float(s.get('target_ph', 6.0))
+        self._ph_tolerance = float(s.get('ph_tolerance', 0.3))
+        self._target_ec = float(s.get('target_ec', 1.8))
+        self._ec_tolerance = float(s.get('ec_tolerance', 0.2))
+        self._mixing_time = int(s.get('mixing_time', 30))
+
+    def _rebuild_pump_params(self):
+        """Rebuild the per-pump parameter table from settings
+
+        The dosing paths read per-pump values many times per call; a single
+        dict lookup plus attribute access is cheaper than repeated
+        settings.get() calls with formatted keys.
+        """
+        s = self.settings
+        self._pump_params = {
+            'ph_up': PumpParams(s.get('ph_up_rate', 1.0),
+                                s.get('max_ph_adjustment', 20),
+                                s.get('max_daily_ph_up', 100)),
+            'ph_down': PumpParams(s.get('ph_down_rate', 1.0),
+                                  s.get('max_ph_adjustment', 20),
+                                  s.get('max_daily_ph_down', 100)),
+            'nutrient_a': PumpParams(s.get('nutrient_a_rate', 1.0),
+                                     s.get('max_nutrient_dose', 20),
+                                     s.get('max_daily_nutrient', 200)),
+            'nutrient_b': PumpParams(s.get('nutrient_b_rate', 1.0),
+                                     s.get('max_nutrient_dose', 20),
+                                     s.get('max_daily_nutrient', 200)),
+        }
+
+    def _mark_config_dirty(self):
+        """Schedule a coalesced config save
+
+        Bursts of settings updates (e.g. a UI submitting several sections)
+        collapse into a single file rewrite, reducing SD-card wear.
+        """
+        with self._save_lock:
+            self._config_dirty = True
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self._save_delay, self._flush_config)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _flush_config(self):
+        """Write pending settings to disk if there are any"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._config_dirty:
+                return
+            self._config_dirty = False
+            try:
+                self.config_manager.set_setting('dosing', self.settings)
+                self.config_manager.save_config()
+            except Exception:
+                logger.exception("Error saving dosing settings")
+
+    def _cache_night_times(self):
+        """Parse and cache the night-mode window as integer minutes-of-day
+
+        Parsing is cheap (a pre-compiled regex match, no strptime or
+        datetime objects), and the times only change via
+        update_safety_settings, so parse once here instead of on every
+        night-mode check. Storing the window as minutes-of-day lets the
+        check run on plain int arithmetic.
+        """
+        start = _HHMM_MATCH(str(self.settings.get('night_start', '22:00')))
+        end = _HHMM_MATCH(str(self.settings.get('night_end', '06:00')))
+        if start is None or end is None:
+            logger.error(f"Invalid night mode times: "
+                         f"{self.settings.get('night_start')!r} - "
+                         f"{self.settings.get('night_end')!r}")
+            self._night_start_m = None
+            self._night_end_m = None
+            return
+        self._night_start_m = int(start.group(1)) * 60 + int(start.group(2))
+        self._night_end_m = int(end.group(1)) * 60 + int(end.group(2))
+
+        # Local-time offset for the minute-of-day comparison; a DST change
+        # is picked up on the next settings update or restart
+        self._utc_offset = time.localtime().tm_gmtoff
+
     def start(self):
         """Start the dosing controller thread"""
         if self.running:
@@ -94,6 +275,8 @@ class DosingController:
         
         logger.info("Starting dosing controller")
         self.running = True
+        self._stop_event.clear()
+        self._wakeup.clear()
         self.dosing_thread = threading.Thread(target=self._dosing_loop, daemon=True)
         self.dosing_thread.start()
     
@@ -105,11 +288,69 @@ class DosingController:
         
         logger.info("Stopping dosing controller")
         self.running = False
+        self._stop_event.set()
+        self._wakeup.set()
+
+        # Emergency-stop the pumps immediately rather than waiting for the
+        # worker thread to wake from a mixing wait
+        if self.pumps:
+            self.pumps.all_pumps_off()
+
         if self.dosing_thread:
             self.dosing_thread.join(timeout=10)
-        
-        # Ensure all pumps are off
-        self.pumps.all_pumps_off()
+
+        # Ensure all pumps are off (in case one started during shutdown)
+        if self.pumps:
+            self.pumps.all_pumps_off()
+
+        # Flush any pending settings save
+        self._flush_config()
+
+    def _interruptible_sleep(self, seconds: float) -> bool:
+        """Wait that wakes immediately when stop() is called
+
+        Args:
+            seconds: How long to wait
+
+        Returns:
+            bool: True if the controller is stopping and the caller should abort
+        """
+        return self._stop_event.wait(seconds)
+
+    def _run_pump_timed(self, pump_id: str, run_time: float,
+                        flow_rate: float) -> Tuple[bool, float]:
+        """Run a pump for a duration, interruptible by stop()
+
+        Starts the pump, waits on the stop event and stops the pump
+        afterwards, instead of handing the whole run to a blocking call.
+        An emergency stop therefore takes effect mid-dose, and a cut-short
+        run is credited only for the volume actually delivered.
+
+        Args:
+            pump_id: The pump to run
+            run_time: Target run time in seconds
+            flow_rate: Pump flow rate in ml/sec, for partial-dose accounting
+
+        Returns:
+            Tuple of (completed, dispensed_ml)
+        """
+        if run_time <= 0:
+            return False, 0.0
+
+        started = time.monotonic()
+        if not self.pumps.run_pump(pump_id, True):
+            return False, 0.0
+
+        try:
+            interrupted = self._interruptible_sleep(run_time)
+        finally:
+            self.pumps.run_pump(pump_id, False)
+
+        if interrupted:
+            elapsed = min(time.monotonic() - started, run_time)
+            return False, elapsed * flow_rate
+
+        return True, run_time * flow_rate
     
     def _dosing_loop(self):
         """Main dosing control loop"""
@@ -119,10 +360,10 @@ class DosingController:
             try:
                 # Reset daily totals if day changed
                 self._check_daily_reset()
-                
+
                 # Check if it's time to run a dosing cycle
-                current_time = time.time()
-                
+                current_time = time.monotonic()
+
                 if current_time >= self.next_run:
                     # Check if night mode is enabled and we're in night hours
                     if not self._is_night_mode_active():
@@ -132,57 +373,74 @@ class DosingController:
                     else:
                         logger.info("Skipping dosing cycle due to night mode")
                         self._schedule_next_run()
-                
-                # Sleep for a bit to avoid high CPU usage
-                time.sleep(10)
-                
-            except Exception as e:
-                logger.error(f"Error in dosing loop: {e}")
-                time.sleep(60)  # Longer sleep on error
+
+                # Sleep until the next scheduled cycle; stop() and schedule
+                # changes wake us immediately
+                self._wakeup.wait(timeout=max(0.0, self.next_run - time.monotonic()))
+                self._wakeup.clear()
+                if not self.running:
+                    break
+
+            except Exception:
+                logger.exception("Error in dosing loop")
+                self._wakeup.wait(60)  # Longer sleep on error
+                self._wakeup.clear()
+                if not self.running:
+                    break
     
     def _check_daily_reset(self):
-        """Reset daily dosing totals if the day has changed"""
+        """Reset daily dosing totals if the day has changed
+
+        The watermark holds the earliest pending reset across all pumps,
+        so the common no-reset case is a single float compare rather than
+        a walk over every pump's history.
+        """
         current_time = time.time()
-        
-        for pump_id, history in self.daily_totals.items():
-            # Reset if more than 24 hours have passed
-            if current_time - history['last_reset'] > 86400:  # 24 hours in seconds
-                logger.info(f"Resetting daily total for {pump_id}")
-                history['daily_total'] = 0
-                history['last_reset'] = current_time
+        if current_time < self._next_reset_due:
+            return
+
+        with self._state_lock:
+            for pump_id, history in self.daily_totals.items():
+                # Reset if more than 24 hours have passed
+                if current_time - history['last_reset'] > 86400:  # 24 hours in seconds
+                    logger.info(f"Resetting daily total for {pump_id}")
+                    history['daily_total'] = 0
+                    history['last_reset'] = current_time
+
+            self._next_reset_due = min(
+                h['last_reset'] for h in self.daily_totals.values()) + 86400.0
     
     def _is_night_mode_active(self) -> bool:
         """Check if night mode is active"""
         if not self.settings.get('enable_night_mode', False):
             return False
-        
-        # Parse night time settings
-        try:
-            night_start = self.settings.get('night_start', '22:00')
-            night_end = self.settings.get('night_end', '06:00')
-            
-            # Get current time
-            now = datetime.datetime.now().time()
-            
-            # Parse night start and end times
-            start_time = datetime.datetime.strptime(night_start, '%H:%M').time()
-            end_time = datetime.datetime.strptime(night_end, '%H:%M').time()
-            
-            # Check if current time is in night period
-            if start_time < end_time:  # Normal time range (e.g., 22:00 to 06:00)
-                return start_time <= now <= end_time
-            else:  # Time range spans midnight (e.g., 22:00 to 06:00)
-                return now >= start_time or now <= end_time
-                
-        except Exception as e:
-            logger.error(f"Error checking night mode: {e}")
-            return False
+
+        # Use the cached window; re-parse only on a cache miss
+        start_m = self._night_start_m
+        end_m = self._night_end_m
+        if start_m is None or end_m is None:
+            self._cache_night_times()
+            start_m = self._night_start_m
+            end_m = self._night_end_m
+            if start_m is None or end_m is None:
+                return False
+
+        # Pure int arithmetic — no datetime objects per check
+        now_m = (int(time.time() + self._utc_offset) // 60) % 1440
+
+        # Check if current time is in night period
+        if start_m < end_m:  # Normal time range (e.g., 01:00 to 06:00)
+            return start_m <= now_m <= end_m
+        else:  # Time range spans midnight (e.g., 22:00 to 06:00)
+            return now_m >= start_m or now_m <= end_m
     
     def _schedule_next_run(self):
         """Schedule the next dosing cycle"""
         frequency_minutes = self.settings.get('dosing_frequency', 60)
-        self.last_run = time.time()
-        self.next_run = self.last_run + (frequency_minutes * 60)
+        # Monotonic clock so NTP steps can't cause missed or doubled cycles
+        with self._state_lock:
+            self.last_run = time.monotonic()
+            self.next_run = self.last_run + (frequency_minutes * 60)
         
         logger.info(f"Next dosing cycle scheduled in {frequency_minutes} minutes")
     
@@ -195,49 +453,28 @@ class DosingController:
         Returns:
             Tuple of (pump_id, dose_ml) for pH adjustment
         """
-        target_ph = self.settings.get('target_ph', 6.0)
-        ph_tolerance = self.settings.get('ph_tolerance', 0.3)
-        
         # Check if pH is within tolerance
-        upper_bound = target_ph + ph_tolerance
-        lower_bound = target_ph - ph_tolerance
-        
-        if lower_bound <= current_ph <= upper_bound:
+        err = current_ph - self._target_ph
+        if abs(err) <= self._ph_tolerance:
             # pH is within acceptable range
             return None, 0
-        
-        # Determine which direction to adjust
-        if current_ph > upper_bound:
-            # pH is too high, need to decrease
-            pump_id = 'ph_down'
-            rate = self.settings.get('ph_down_rate', 1.0)  # ml/s
-            max_dose = self.settings.get('max_ph_adjustment', 20)  # ml
-            max_daily = self.settings.get('max_daily_ph_down', 100)  # ml
-            
-            # Calculate dose based on how far from target
-            ph_diff = current_ph - target_ph
-            # Non-linear scaling based on pH difference
-            # This is a simple approximation - may need calibration for specific systems
-            dose_ml = min(ph_diff * 5, max_dose)
-            
-        else:
-            # pH is too low, need to increase
-            pump_id = 'ph_up'
-            rate = self.settings.get('ph_up_rate', 1.0)  # ml/s
-            max_dose = self.settings.get('max_ph_adjustment', 20)  # ml
-            max_daily = self.settings.get('max_daily_ph_up', 100)  # ml
-            
-            # Calculate dose based on how far from target
-            ph_diff = target_ph - current_ph
-            # Non-linear scaling based on pH difference
-            dose_ml = min(ph_diff * 5, max_dose)
-        
-        # Check daily limits
-        daily_used = self.daily_totals[pump_id]['daily_total']
-        if daily_used + dose_ml > max_daily:
+
+        # Pick the pump by the sign of the error; the arithmetic is symmetric
+        pump_id = 'ph_down' if err > 0 else 'ph_up'
+        params = self._pump_params[pump_id]
+
+        # Calculate dose based on how far from target
+        # Non-linear scaling based on pH difference
+        # This is a simple approximation - may need calibration for specific systems
+        dose_ml = min(abs(err) * 5, params.max_dose)
+
+        # Clamp to the remaining daily budget
+        with self._state_lock:
+            daily_used = self.daily_totals[pump_id]['daily_total']
+        if daily_used + dose_ml > params.max_daily:
             logger.warning(f"Daily limit reached for {pump_id}. Limiting dose.")
-            dose_ml = max(0, max_daily - daily_used)
-        
+        dose_ml = max(0, min(dose_ml, params.max_daily - daily_used))
+
         return pump_id, dose_ml
     
     def _calculate_nutrient_dose(self, current_ec: float) -> Tuple[str, float]:
@@ -249,17 +486,17 @@ class DosingController:
         Returns:
             Tuple of (nutrient_type, dose_ml) for nutrient adjustment
         """
-        target_ec = self.settings.get('target_ec', 1.8)
-        ec_tolerance = self.settings.get('ec_tolerance', 0.2)
-        
+        target_ec = self._target_ec
+
         # Check if EC is within tolerance or too high
-        if current_ec >= target_ec - ec_tolerance:
+        if current_ec >= target_ec - self._ec_tolerance:
             # EC is at target or too high, don't add nutrients
             return None, 0
         
         # EC is too low, calculate nutrient dose
-        max_dose = self.settings.get('max_nutrient_dose', 20)  # ml
-        max_daily = self.settings.get('max_daily_nutrient', 200)  # ml
+        params = self._pump_params['nutrient_a']
+        max_dose = params.max_dose  # ml
+        max_daily = params.max_daily  # ml
         
         # Calculate how much EC needs to increase
         ec_diff = target_ec - current_ec
@@ -272,23 +509,46 @@ class DosingController:
         # In a real implementation, this should be based on actual reservoir size
         # and nutrient concentration
         
-        # Check daily limits for both nutrient types
-        a_used = self.daily_totals['nutrient_a']['daily_total']
-        b_used = self.daily_totals['nutrient_b']['daily_total']
-        
-        # Distribute dose evenly between A and B
-        a_dose = dose_ml / 2
-        b_dose = dose_ml / 2
-        
-        # Adjust if daily limits are approached
-        if a_used + a_dose > max_daily:
-            a_dose = max(0, max_daily - a_used)
-        if b_used + b_dose > max_daily:
-            b_dose = max(0, max_daily - b_used)
-        
+        # Distribute the dose evenly between A and B, each clamped to its
+        # remaining daily budget
+        daily_totals = self.daily_totals
+        with self._state_lock:
+            a_dose, b_dose = (
+                max(0, min(dose_ml / 2, max_daily - daily_totals[p]['daily_total']))
+                for p in ('nutrient_a', 'nutrient_b')
+            )
+
         # Return result as (type, dose)
         return "nutrients", (a_dose, b_dose)
     
+    def _compensate_ec(self, ec_raw, temp_c):
+        """Normalize an EC reading to 25°C before dose calculations
+
+        Uncompensated EC swings hard with temperature, which makes the
+        nutrient calculator over- or under-dose and triggers extra
+        correction cycles. The Atlas EZO EC circuit compensates on-chip
+        when the interface keeps it fed with T,<temp> commands
+        (AtlasInterface does, exposing temp_compensation); such readings
+        are returned unchanged. For backends without on-circuit
+        compensation, apply the standard linear correction
+        ec25 = ec / (1 + 0.019 * (temp - 25)).
+
+        Args:
+            ec_raw: Raw EC reading (passed through if not numeric)
+            temp_c: Water temperature in °C (ignored if missing or outside 0-40)
+
+        Returns:
+            EC normalized to 25°C, or ec_raw when no correction applies
+        """
+        if not isinstance(ec_raw, (int, float)):
+            return ec_raw
+        if getattr(self.atlas, 'temp_compensation', None) is not None:
+            # Circuit-side compensation already applied
+            return ec_raw
+        if not isinstance(temp_c, (int, float)) or not (0.0 <= temp_c <= 40.0):
+            return ec_raw
+        return ec_raw / (1.0 + 0.019 * (temp_c - 25.0))
+
     def _get_sensor_readings(self):
         """Get current sensor readings with simulation support
         
@@ -298,7 +558,7 @@ class DosingController:
         if self.simulation_mode or self.atlas is None:
             # Return "sensor not detected" instead of simulated readings
             logger.info("Atlas sensor interface not available, reporting sensors as not detected")
-            return {
+            readings = {
                 'ph': "sensor not detected",
                 'ec': "sensor not detected",
                 'tds': "sensor not detected",
@@ -306,18 +566,43 @@ class DosingController:
             }
         else:
             # Get readings from Atlas interface
-            return {
+            readings = {
                 'ph': self.atlas.read_ph(),
                 'ec': self.atlas.read_ec(),
                 'tds': self.atlas.read_tds(),
                 'temperature': self.atlas.read_temperature()
             }
 
+        # Update the shared snapshot for status polls
+        with self._sensor_cache_lock:
+            self._sensor_cache = dict(readings, ts=time.monotonic())
+
+        return readings
+
+    def _get_cached_readings(self) -> Dict[str, Any]:
+        """Get the latest sensor snapshot, re-reading the probes only when stale
+
+        Atlas EZO circuits take close to a second per reading, so status
+        polls are served from the snapshot written by the last real read
+        (dosing cycle or a previous poll) while it is fresh.
+
+        Returns:
+            Dict with ph, ec, tds, temperature and the snapshot timestamp 'ts'
+        """
+        now = time.monotonic()
+        with self._sensor_cache_lock:
+            age = now - self._sensor_cache['ts']
+        if age > self._sensor_cache_ttl:
+            self._get_sensor_readings()
+        with self._sensor_cache_lock:
+            return dict(self._sensor_cache)
+
     def run_cycle(self):
         """Run a complete dosing cycle"""
         try:
             # Mark start time
-            cycle_start = time.time()
+            # Monotonic for interval timing (immune to clock steps)
+            cycle_start = time.monotonic()
             
             # Get current readings
             readings = self._get_sensor_readings()
@@ -332,7 +617,7 @@ class DosingController:
                     'ph_adjustment_needed': False,
                     'ec_adjustment_needed': False,
                     'error': "Sensors not detected",
-                    'cycle_time': time.time() - cycle_start
+                    'cycle_time': time.monotonic() - cycle_start
                 }
             
             if current_ph is None or current_ec is None:
@@ -342,11 +627,25 @@ class DosingController:
                     'ph_adjustment_needed': False,
                     'ec_adjustment_needed': False,
                     'error': "Failed to get sensor readings",
-                    'cycle_time': time.time() - cycle_start
+                    'cycle_time': time.monotonic() - cycle_start
                 }
             
+            # Normalize EC to 25°C so cool water doesn't read as a deficit
+            current_ec = self._compensate_ec(current_ec, readings['temperature'])
+
             logger.info(f"Current readings - pH: {current_ph}, EC: {current_ec}")
-            
+
+            # Steady-state fast path: both readings in band, nothing to dose
+            if (abs(current_ph - self._target_ph) <= self._ph_tolerance
+                    and current_ec >= self._target_ec - self._ec_tolerance):
+                logger.info("Readings within tolerance, no dosing needed")
+                self._schedule_next_run()
+                return {
+                    'ph_adjustment_needed': False,
+                    'ec_adjustment_needed': False,
+                    'cycle_time': time.monotonic() - cycle_start
+                }
+
             # Check pH and calculate dose
             ph_adjustment_needed = False
             ph_pump, ph_dose = self._calculate_ph_dose(current_ph)
@@ -387,7 +686,7 @@ class DosingController:
             self._schedule_next_run()
             
             # Log completion
-            cycle_time = time.time() - cycle_start
+            cycle_time = time.monotonic() - cycle_start
             logger.info(f"Dosing cycle completed in {cycle_time:.1f} seconds")
             
             # Return status
@@ -398,13 +697,13 @@ class DosingController:
             }
             
         except Exception as e:
-            logger.error(f"Error running dosing cycle: {e}")
+            logger.exception("Error running dosing cycle")
             self._schedule_next_run()
             return {
                 'error': str(e),
                 'ph_adjustment_needed': False,
                 'ec_adjustment_needed': False,
-                'cycle_time': time.time() - cycle_start if 'cycle_start' in locals() else 0
+                'cycle_time': time.monotonic() - cycle_start if 'cycle_start' in locals() else 0
             }
     
     def _dose_ph(self, pump_id: str, dose_ml: float) -> bool:
@@ -424,49 +723,53 @@ class DosingController:
                 # Add to history
                 self._add_to_history(pump_id, dose_ml)
                 # Simulate mixing time
-                mixing_time = self.settings.get('mixing_time', 30)
+                mixing_time = self._mixing_time
                 logger.info(f"[SIMULATION] Mixing for {mixing_time} seconds")
-                time.sleep(1)  # Just a short delay in simulation
+                self._interruptible_sleep(1)  # Just a short delay in simulation
                 return True
             
             # Check if we've exceeded daily maximum
-            daily_max = self.settings.get(f'max_daily_{pump_id}', 100)
-            current_total = self.daily_totals[pump_id]['daily_total']
-            
-            if current_total + dose_ml > daily_max:
+            with self._state_lock:
+                params = self._pump_params[pump_id]
+                current_total = self.daily_totals[pump_id]['daily_total']
+
+            if current_total + dose_ml > params.max_daily:
                 logger.warning(f"Daily maximum for {pump_id} exceeded, limiting dose")
-                dose_ml = max(0, daily_max - current_total)
-            
+                dose_ml = max(0, params.max_daily - current_total)
+
             if dose_ml <= 0:
                 logger.warning(f"Zero or negative dose calculated for {pump_id}, skipping")
                 return False
-            
-            # Get flow rate from settings
-            flow_rate = self.settings.get(f'{pump_id}_rate', 1.0)  # ml/sec
+
+            # Get flow rate from the pump table
+            flow_rate = params.rate  # ml/sec
             
             # Calculate run time
             run_time = dose_ml / flow_rate if flow_rate > 0 else 0
             
-            # Run the pump
+            # Run the pump, interruptible mid-dose by stop()
             logger.info(f"Dosing {dose_ml:.1f}ml of {pump_id} for {run_time:.1f} seconds")
-            success = self.pumps.run_pump_for_seconds(pump_id, run_time)
-            
-            if success:
-                # Add to history
-                self._add_to_history(pump_id, dose_ml)
-                
-                # Wait for mixing
-                mixing_time = self.settings.get('mixing_time', 30)
+            completed, dispensed = self._run_pump_timed(pump_id, run_time, flow_rate)
+
+            if dispensed > 0:
+                self._add_to_history(pump_id, dispensed)
+
+            if completed:
+                # Wait for mixing (abandoned early if stop() is called)
+                mixing_time = self._mixing_time
                 logger.info(f"Mixing for {mixing_time} seconds")
-                time.sleep(mixing_time)
-                
+                self._interruptible_sleep(mixing_time)
+
                 return True
+            elif dispensed > 0:
+                logger.warning(f"Dose of {pump_id} cut short at {dispensed:.1f}ml by shutdown")
+                return False
             else:
                 logger.error(f"Failed to run pump {pump_id}")
                 return False
             
-        except Exception as e:
-            logger.error(f"Error dosing {pump_id}: {e}")
+        except Exception:
+            logger.exception("Error dosing %s", pump_id)
             return False
 
     def _dose_nutrients(self, a_dose: float, b_dose: float) -> bool:
@@ -487,74 +790,78 @@ class DosingController:
                 self._add_to_history('nutrient_a', a_dose)
                 self._add_to_history('nutrient_b', b_dose)
                 # Simulate mixing time
-                mixing_time = self.settings.get('mixing_time', 30)
+                mixing_time = self._mixing_time
                 logger.info(f"[SIMULATION] Mixing for {mixing_time} seconds")
-                time.sleep(1)  # Just a short delay in simulation
+                self._interruptible_sleep(1)  # Just a short delay in simulation
                 return True
             
             # Check if we've exceeded daily maximum for nutrients
-            daily_max_a = self.settings.get('max_daily_nutrient_a', 100)
-            daily_max_b = self.settings.get('max_daily_nutrient_b', 100)
-            
-            current_total_a = self.daily_totals['nutrient_a']['daily_total']
-            current_total_b = self.daily_totals['nutrient_b']['daily_total']
-            
-            if current_total_a + a_dose > daily_max_a:
+            with self._state_lock:
+                params_a = self._pump_params['nutrient_a']
+                params_b = self._pump_params['nutrient_b']
+
+                current_total_a = self.daily_totals['nutrient_a']['daily_total']
+                current_total_b = self.daily_totals['nutrient_b']['daily_total']
+
+            if current_total_a + a_dose > params_a.max_daily:
                 logger.warning("Daily maximum for nutrient A exceeded, limiting dose")
-                a_dose = max(0, daily_max_a - current_total_a)
-            
-            if current_total_b + b_dose > daily_max_b:
+                a_dose = max(0, params_a.max_daily - current_total_a)
+
+            if current_total_b + b_dose > params_b.max_daily:
                 logger.warning("Daily maximum for nutrient B exceeded, limiting dose")
-                b_dose = max(0, daily_max_b - current_total_b)
-            
+                b_dose = max(0, params_b.max_daily - current_total_b)
+
             if a_dose <= 0 and b_dose <= 0:
                 logger.warning("Zero or negative dose calculated for nutrients, skipping")
                 return False
-            
-            # Get flow rates
-            a_flow_rate = self.settings.get('nutrient_a_rate', 1.0)  # ml/sec
-            b_flow_rate = self.settings.get('nutrient_b_rate', 1.0)  # ml/sec
+
+            # Get flow rates from the pump table
+            a_flow_rate = params_a.rate  # ml/sec
+            b_flow_rate = params_b.rate  # ml/sec
             
             # Calculate run times
             a_run_time = a_dose / a_flow_rate if a_flow_rate > 0 and a_dose > 0 else 0
             b_run_time = b_dose / b_flow_rate if b_flow_rate > 0 and b_dose > 0 else 0
             
-            # Dose nutrient A
+            # Dose nutrient A, interruptible mid-dose by stop()
             if a_dose > 0:
                 logger.info(f"Dosing {a_dose:.1f}ml of nutrient A for {a_run_time:.1f} seconds")
-                success_a = self.pumps.run_pump_for_seconds('nutrient_a', a_run_time)
-                
-                if success_a:
-                    self._add_to_history('nutrient_a', a_dose)
-                else:
-                    logger.error("Failed to run nutrient A pump")
+                completed_a, dispensed_a = self._run_pump_timed(
+                    'nutrient_a', a_run_time, a_flow_rate)
+
+                if dispensed_a > 0:
+                    self._add_to_history('nutrient_a', dispensed_a)
+                if not completed_a:
+                    logger.error("Nutrient A dose did not complete")
                     return False
-            
-            # Wait briefly between nutrient doses
+
+            # Pause between nutrient doses (configurable); skip B if shutting down
             if a_dose > 0 and b_dose > 0:
-                time.sleep(2)
-            
+                if self._interruptible_sleep(self.settings.get('nutrient_ab_pause', 2)):
+                    return False
+
             # Dose nutrient B
             if b_dose > 0:
                 logger.info(f"Dosing {b_dose:.1f}ml of nutrient B for {b_run_time:.1f} seconds")
-                success_b = self.pumps.run_pump_for_seconds('nutrient_b', b_run_time)
-                
-                if success_b:
-                    self._add_to_history('nutrient_b', b_dose)
-                else:
-                    logger.error("Failed to run nutrient B pump")
+                completed_b, dispensed_b = self._run_pump_timed(
+                    'nutrient_b', b_run_time, b_flow_rate)
+
+                if dispensed_b > 0:
+                    self._add_to_history('nutrient_b', dispensed_b)
+                if not completed_b:
+                    logger.error("Nutrient B dose did not complete")
                     return False
             
-            # Wait for mixing
+            # Wait for mixing (abandoned early if stop() is called)
             if a_dose > 0 or b_dose > 0:
-                mixing_time = self.settings.get('mixing_time', 30)
+                mixing_time = self._mixing_time
                 logger.info(f"Mixing for {mixing_time} seconds")
-                time.sleep(mixing_time)
+                self._interruptible_sleep(mixing_time)
             
             return True
             
-        except Exception as e:
-            logger.error(f"Error dosing nutrients: {e}")
+        except Exception:
+            logger.exception("Error dosing nutrients")
             return False
 
     def _add_to_history(self, pump_id: str, volume: float):
@@ -565,24 +872,52 @@ class DosingController:
             volume: Volume dosed in ml
         """
         timestamp = time.time()
-        
+
         # Add to daily total
-        if pump_id in self.daily_totals:
-            self.daily_totals[pump_id]['daily_total'] += volume
-        
-        # Add to history
+        daily_totals = self.daily_totals
+        if pump_id in daily_totals:
+            with self._state_lock:
+                daily_totals[pump_id]['daily_total'] += volume
+
+        # Add to history; the human-readable time string is synthesized on
+        # demand in get_dosing_history rather than paid per event
         entry = {
             'pump': pump_id,
             'volume': volume,
-            'timestamp': timestamp,
-            'time': datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            'timestamp': timestamp
         }
-        
+
         self.dosing_history.append(entry)
-        
-        # Limit history to last 100 entries
-        if len(self.dosing_history) > 100:
-            self.dosing_history = self.dosing_history[-100:]
+
+        # Readings are stale once chemicals go in; make the next status
+        # poll take a fresh reading instead of serving the snapshot
+        with self._sensor_cache_lock:
+            self._sensor_cache['ts'] = 0.0
+
+    @staticmethod
+    def _format_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the human-readable 'time' field to a history entry
+
+        Args:
+            entry: Raw history entry with an epoch 'timestamp'
+
+        Returns:
+            Copy of the entry with a formatted 'time' string
+        """
+        out = dict(entry)
+        out['time'] = time.strftime('%Y-%m-%d %H:%M:%S',
+                                    time.localtime(entry['timestamp']))
+        return out
+
+    def get_dosing_history(self) -> List[Dict[str, Any]]:
+        """Get recent dose events, oldest first
+
+        Returns:
+            List of history entry dicts with formatted 'time' strings
+        """
+        with self._state_lock:
+            entries = list(self.dosing_history)
+        return [self._format_entry(e) for e in entries]
     
     def manual_dose(self, pump_id: str, volume_ml: float) -> bool:
         """Manually run a pump to dose a specific amount
@@ -594,36 +929,45 @@ class DosingController:
         Returns:
             bool: True if successful, False otherwise
         """
-        if pump_id not in ['ph_up', 'ph_down', 'nutrient_a', 'nutrient_b']:
+        if pump_id not in self._VALID_PUMPS:
             logger.error(f"Invalid pump ID: {pump_id}")
             return False
         
         logger.info(f"Manual dosing {volume_ml:.1f}ml with {pump_id}")
-        
-        # Get flow rate for this pump
-        rate_key = f"{pump_id}_rate"
-        flow_rate = self.settings.get(rate_key, 1.0)  # ml/sec
-        
+
+        # Get per-pump parameters
+        params = self._pump_params[pump_id]
+
         # Calculate run time
-        run_time = volume_ml / flow_rate
-        
-        # Check daily limits
-        max_daily = self.settings.get(f"max_daily_{pump_id.replace('nutrient_', '')}", 100)
-        current_total = self.daily_totals[pump_id]['daily_total']
-        
-        if current_total + volume_ml > max_daily:
+        run_time = volume_ml / params.rate
+
+        # Reserve the dose against the daily limit in one critical section,
+        # so a concurrent automatic dose can't slip past the cap between
+        # the check and the credit
+        with self._state_lock:
+            current_total = self.daily_totals[pump_id]['daily_total']
+            if current_total + volume_ml > params.max_daily:
+                reserved = False
+            else:
+                self.daily_totals[pump_id]['daily_total'] = current_total + volume_ml
+                reserved = True
+
+        if not reserved:
             logger.warning(f"Daily limit for {pump_id} would be exceeded")
             return False
-        
+
         # Run the pump
         success = self.pumps.run_pump_for_seconds(pump_id, run_time)
-        
+
         if success:
-            # Update dosing history
-            self.daily_totals[pump_id]['daily_total'] += volume_ml
             logger.info(f"Manual dose complete: {volume_ml:.1f}ml using {pump_id}")
+            # Wake the scheduler so it sees the updated totals
+            self._wakeup.set()
             return True
         else:
+            # Release the reservation — nothing was dosed
+            with self._state_lock:
+                self.daily_totals[pump_id]['daily_total'] -= volume_ml
             logger.error(f"Failed to run pump {pump_id}")
             return False
     
@@ -647,11 +991,14 @@ class DosingController:
                 ph_dose = 0
                 nutrient_type = None
                 nutrient_dose = 0
+                sensor_age_s = None
             else:
-                # Get readings from Atlas
-                ph = self.atlas.read_ph()
-                ec = self.atlas.read_ec()
-                
+                # Serve from the cached snapshot instead of re-reading the probes
+                snapshot = self._get_cached_readings()
+                ph = snapshot['ph']
+                ec = self._compensate_ec(snapshot['ec'], snapshot['temperature'])
+                sensor_age_s = time.monotonic() - snapshot['ts']
+
                 # Calculate adjustment needs if we have numeric readings
                 if isinstance(ph, (int, float)) and isinstance(ec, (int, float)):
                     ph_pump, ph_dose = self._calculate_ph_dose(ph)
@@ -659,7 +1006,11 @@ class DosingController:
                     
                     # Determine if adjustments are needed
                     ph_adjustment_needed = ph_pump is not None and ph_dose > 0
-                    ec_adjustment_needed = nutrient_type is not None and sum(nutrient_dose) > 0 if isinstance(nutrient_dose, tuple) else nutrient_dose > 0
+                    if nutrient_type is None:
+                        ec_adjustment_needed = False
+                    else:
+                        a_dose, b_dose = nutrient_dose
+                        ec_adjustment_needed = (a_dose + b_dose) > 0
                 else:
                     # If readings are not numeric, we can't determine if adjustments are needed
                     ph_adjustment_needed = False
@@ -669,28 +1020,41 @@ class DosingController:
                     nutrient_type = None
                     nutrient_dose = 0
             
+            # Snapshot shared state under the lock, format outside it
+            with self._state_lock:
+                last_run = self.last_run
+                next_run = self.next_run
+                target_ph = self.settings.get('target_ph')
+                target_ec = self.settings.get('target_ec')
+
             # Format time until next run
-            time_to_next = max(0, self.next_run - time.time())
+            now_mono = time.monotonic()
+            time_to_next = max(0, next_run - now_mono)
             minutes = int(time_to_next // 60)
             seconds = int(time_to_next % 60)
-            
+
+            # The schedule runs on the monotonic clock; convert to epoch
+            # seconds at the boundary so the API keeps its original units
+            now_epoch = time.time()
+
             # Return status information
             return {
                 'running': self.running,
-                'last_run': self.last_run,
-                'next_run': self.next_run,
+                'last_run': now_epoch + (last_run - now_mono),
+                'next_run': now_epoch + (next_run - now_mono),
                 'time_to_next': f"{minutes}m {seconds}s",
                 'current_ph': ph,
-                'target_ph': self.settings.get('target_ph'),
+                'target_ph': target_ph,
                 'ph_adjustment_needed': ph_adjustment_needed,
                 'current_ec': ec,
-                'target_ec': self.settings.get('target_ec'),
+                'target_ec': target_ec,
                 'ec_adjustment_needed': ec_adjustment_needed,
                 'night_mode_active': self._is_night_mode_active(),
-                'sensors_detected': self.atlas is not None
+                'sensors_detected': self.atlas is not None,
+                'sensor_age_s': sensor_age_s
             }
         except Exception as e:
-            logger.error(f"Error getting dosing status: {e}")
+            logger.exception("Error getting dosing status")
             return {
                 'running': self.running,
                 'error': str(e),
@@ -705,54 +1069,100 @@ class DosingController:
         """
         return self.settings
     
+    def _validate_settings_patch(self, patch: Dict[str, Any],
+                                 allowed: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """Validate a settings patch against the schema
+
+        Args:
+            patch: Dict of settings to validate
+            allowed: Schema keys this update is permitted to touch
+
+        Returns:
+            Dict of converted values if every supplied field is valid,
+            None if any field fails (nothing should be applied)
+        """
+        validated = {}
+        for key in allowed:
+            if key not in patch:
+                continue
+            low, high, conv = self._SETTINGS_SCHEMA[key]
+            value = patch[key]
+            if conv == 'time':
+                # Validate HH:MM format, keep the string form
+                if not isinstance(value, str) or _HHMM_MATCH(value) is None:
+                    logger.error(f"Invalid time for {key}: {value}")
+                    return None
+                validated[key] = value
+            elif conv is bool:
+                validated[key] = bool(value)
+            else:
+                try:
+                    converted = conv(value)
+                except (TypeError, ValueError):
+                    logger.error(f"Invalid value for {key}: {value}")
+                    return None
+                if not (low <= converted <= high):
+                    logger.error(f"Value out of range for {key}: {converted}")
+                    return None
+                validated[key] = converted
+        return validated
+
+    def _apply_settings_patch(self, patch: Dict[str, Any],
+                              allowed: Tuple[str, ...]) -> bool:
+        """Validate and atomically apply a settings patch
+
+        Either every supplied field passes validation and all are applied
+        together, or nothing changes — a bad field no longer leaves the
+        earlier fields of the same request committed.
+
+        Args:
+            patch: Dict of settings to apply
+            allowed: Schema keys this update is permitted to touch
+
+        Returns:
+            bool: True if the patch was applied
+        """
+        validated = self._validate_settings_patch(patch, allowed)
+        if validated is None:
+            return False
+
+        with self._state_lock:
+            self.settings.update(validated)
+
+            # Refresh caches derived from settings
+            if 'night_start' in validated or 'night_end' in validated:
+                self._cache_night_times()
+            self._rebuild_pump_params()
+            self._refresh_cached_settings()
+
+            # Re-anchor the schedule on a frequency change so a shorter
+            # interval takes effect now, not after the old one expires
+            if 'dosing_frequency' in validated:
+                self.next_run = self.last_run + validated['dosing_frequency'] * 60
+        self._mark_config_dirty()
+
+        # Wake the scheduler so the new settings take effect immediately
+        self._wakeup.set()
+        return True
+
     def update_target_settings(self, settings: Dict[str, Any]) -> bool:
         """Update target dosing settings
-        
+
         Args:
             settings: Dict containing settings to update
-            
+
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Validate settings
-            if 'target_ph' in settings:
-                ph = float(settings['target_ph'])
-                if not (4.0 <= ph <= 9.0):
-                    logger.error(f"Invalid target pH: {ph}")
-                    return False
-                self.settings['target_ph'] = ph
-            
-            if 'ph_tolerance' in settings:
-                tol = float(settings['ph_tolerance'])
-                if not (0.1 <= tol <= 1.0):
-                    logger.error(f"Invalid pH tolerance: {tol}")
-                    return False
-                self.settings['ph_tolerance'] = tol
-            
-            if 'target_ec' in settings:
-                ec = float(settings['target_ec'])
-                if not (0.1 <= ec <= 5.0):
-                    logger.error(f"Invalid target EC: {ec}")
-                    return False
-                self.settings['target_ec'] = ec
-            
-            if 'ec_tolerance' in settings:
-                tol = float(settings['ec_tolerance'])
-                if not (0.1 <= tol <= 1.0):
-                    logger.error(f"Invalid EC tolerance: {tol}")
-                    return False
-                self.settings['ec_tolerance'] = tol
-            
-            # Save settings to config
-            self.config_manager.set_setting('dosing', self.settings)
-            self.config_manager.save_config()
-            
+            if not self._apply_settings_patch(settings, self._TARGET_KEYS):
+                return False
+
             logger.info(f"Updated target settings: {settings}")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error updating target settings: {e}")
+
+        except Exception:
+            logger.exception("Error updating target settings")
             return False
     
     def update_nutrient_settings(self, settings: Dict[str, Any]) -> bool:
@@ -765,33 +1175,14 @@ class DosingController:
             bool: True if successful, False otherwise
         """
         try:
-            # Handle flow rates
-            for key in ['ph_up_rate', 'ph_down_rate', 'nutrient_a_rate', 'nutrient_b_rate']:
-                if key in settings:
-                    rate = float(settings[key])
-                    if not (0.1 <= rate <= 10.0):
-                        logger.error(f"Invalid flow rate for {key}: {rate}")
-                        return False
-                    self.settings[key] = rate
-            
-            # Handle max doses
-            for key in ['max_ph_adjustment', 'max_nutrient_dose']:
-                if key in settings:
-                    max_dose = float(settings[key])
-                    if not (1.0 <= max_dose <= 100.0):
-                        logger.error(f"Invalid max dose for {key}: {max_dose}")
-                        return False
-                    self.settings[key] = max_dose
-            
-            # Save settings to config
-            self.config_manager.set_setting('dosing', self.settings)
-            self.config_manager.save_config()
-            
+            if not self._apply_settings_patch(settings, self._NUTRIENT_KEYS):
+                return False
+
             logger.info(f"Updated nutrient settings: {settings}")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error updating nutrient settings: {e}")
+
+        except Exception:
+            logger.exception("Error updating nutrient settings")
             return False
     
     def update_safety_settings(self, settings: Dict[str, Any]) -> bool:
@@ -804,68 +1195,12 @@ class DosingController:
             bool: True if successful, False otherwise
         """
         try:
-            # Handle daily limits
-            for key in ['max_daily_ph_up', 'max_daily_ph_down', 'max_daily_nutrient']:
-                if key in settings:
-                    max_daily = float(settings[key])
-                    if not (10.0 <= max_daily <= 1000.0):
-                        logger.error(f"Invalid daily limit for {key}: {max_daily}")
-                        return False
-                    self.settings[key] = max_daily
-            
-            # Handle timing settings
-            if 'dosing_frequency' in settings:
-                freq = int(settings['dosing_frequency'])
-                if not (5 <= freq <= 1440):  # 5 min to 24 hours
-                    logger.error(f"Invalid dosing frequency: {freq}")
-                    return False
-                self.settings['dosing_frequency'] = freq
-            
-            if 'dosing_cooldown' in settings:
-                cooldown = int(settings['dosing_cooldown'])
-                if not (1 <= cooldown <= 120):  # 1 min to 2 hours
-                    logger.error(f"Invalid dosing cooldown: {cooldown}")
-                    return False
-                self.settings['dosing_cooldown'] = cooldown
-            
-            if 'mixing_time' in settings:
-                mixing = int(settings['mixing_time'])
-                if not (5 <= mixing <= 300):  # 5 sec to 5 min
-                    logger.error(f"Invalid mixing time: {mixing}")
-                    return False
-                self.settings['mixing_time'] = mixing
-            
-            # Handle night mode settings
-            if 'enable_night_mode' in settings:
-                self.settings['enable_night_mode'] = bool(settings['enable_night_mode'])
-            
-            if 'night_start' in settings:
-                # Validate time format HH:MM
-                time_str = settings['night_start']
-                try:
-                    datetime.datetime.strptime(time_str, '%H:%M')
-                    self.settings['night_start'] = time_str
-                except ValueError:
-                    logger.error(f"Invalid night start time: {time_str}")
-                    return False
-            
-            if 'night_end' in settings:
-                # Validate time format HH:MM
-                time_str = settings['night_end']
-                try:
-                    datetime.datetime.strptime(time_str, '%H:%M')
-                    self.settings['night_end'] = time_str
-                except ValueError:
-                    logger.error(f"Invalid night end time: {time_str}")
-                    return False
-            
-            # Save settings to config
-            self.config_manager.set_setting('dosing', self.settings)
-            self.config_manager.save_config()
-            
+            if not self._apply_settings_patch(settings, self._SAFETY_KEYS):
+                return False
+
             logger.info(f"Updated safety settings: {settings}")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error updating safety settings: {e}")
+
+        except Exception:
+            logger.exception("Error updating safety settings")
             return False 
\ No newline at end of file
@@ -5,7 +5,9 @@ Controls peristaltic pumps for dosing nutrients and pH adjusters
 """
 import os
 import time
+import heapq
 import logging
+import functools
 import threading
 from typing import Dict, Any, Optional, List, Tuple
 
@@ -33,7 +35,20 @@ class PumpManager:
         # Track active pumps and status
         self.active_pumps = {}
         self.pump_states = {}
-        self.lock = threading.RLock()
+        self.lock = threading.Lock()
+
+        # One scheduler thread services all timed runs: a heap of
+        # (deadline, pump_id) pairs, woken through the condition
+        self._stop_heap = []
+        self._stop_cond = threading.Condition(self.lock)
+        self._stop_thread = None
+        self._shutdown = False
+
+        # Debounced config persistence (calibration writes)
+        self._config_dirty = False
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        self._save_delay = 2.0  # seconds
         
         # Initialize GPIO interface
         self.gpio = None
@@ -74,7 +89,13 @@ class PumpManager:
         # Ensure the config is saved
         self.config.set_setting('pumps', self.pump_config)
         
-        # Try to import the appropriate GPIO library
+        # If simulation mode is explicitly selected, skip the library
+        # imports entirely — nothing below is needed
+        if self.gpio_library == 'simulation':
+            logger.info("Using simulation mode for GPIO")
+            self.simulation_mode = True
+            return True
+
         try:
             if self.gpio_library == 'rpi-lgpio':
                 try:
@@ -86,10 +107,10 @@ class PumpManager:
                     return True
                 except ImportError:
                     logger.warning("rpi-lgpio not available, falling back to standard lgpio")
-                except Exception as e:
-                    logger.error(f"Error initializing rpi-lgpio: {e}")
+                except Exception:
+                    logger.exception("Error initializing rpi-lgpio")
                     return False
-            
+
             # Try standard lgpio if rpi-lgpio failed or not selected
             if self.gpio_library == 'lgpio' or (self.gpio_library == 'rpi-lgpio' and self.gpio is None):
                 try:
@@ -101,23 +122,17 @@ class PumpManager:
                     return True
                 except ImportError:
                     logger.warning("lgpio not available")
-                except Exception as e:
-                    logger.error(f"Error initializing lgpio: {e}")
+                except Exception:
+                    logger.exception("Error initializing lgpio")
                     return False
-            
-            # If simulation mode is explicitly selected
-            if self.gpio_library == 'simulation':
-                logger.info("Using simulation mode for GPIO")
-                self.simulation_mode = True
-                return True
-            
+
             # If we get here, no GPIO library was successfully loaded
             logger.error("No GPIO library available, running in simulation mode")
             self.simulation_mode = True
             return False
-            
-        except Exception as e:
-            logger.error(f"Error initializing GPIO: {e}")
+
+        except Exception:
+            logger.exception("Error initializing GPIO")
             self.simulation_mode = True
             return False
     
@@ -134,16 +149,19 @@ class PumpManager:
                     # Configure the pin as an output
                     self.gpio.gpio_claim_output(self.h, pin, 0)  # Start with pump off (0)
                     logger.info(f"Initialized {pump_id} pump on pin {pin}")
-                except Exception as e:
-                    logger.error(f"Error initializing {pump_id} on pin {pin}: {e}")
+                except Exception:
+                    logger.exception("Error initializing %s on pin %s", pump_id, pin)
             
-            # Initialize state
+            # Initialize state; '_write' binds chip handle and pin once so a
+            # toggle is a single call instead of dict+attribute lookups
             self.pump_states[pump_id] = {
                 'state': 'idle',
                 'pin': pin,
                 'start_time': 0,
                 'run_duration': 0,
-                'flow_rate': config.get('flow_rate', 1.0)  # ml/sec
+                'flow_rate': config.get('flow_rate', 1.0),  # ml/sec
+                '_write': (None if self.simulation_mode
+                           else functools.partial(self.gpio.gpio_write, self.h, pin))
             }
     
     def _set_pump(self, pump_id: str, state: int):
@@ -153,57 +171,76 @@ class PumpManager:
             pump_id: The pump to control
             state: 1 for on, 0 for off
         """
-        if pump_id not in self.pump_states:
+        entry = self.pump_states.get(pump_id)
+        if entry is None:
             logger.error(f"Unknown pump: {pump_id}")
             return False
-        
-        pin = self.pump_states[pump_id]['pin']
-        
+
         if self.simulation_mode:
-            logger.info(f"Simulation: {pump_id} on pin {pin} set to {state}")
+            logger.debug("Simulation: %s on pin %s set to %s",
+                         pump_id, entry['pin'], state)
             return True
-        
+
         try:
-            self.gpio.gpio_write(self.h, pin, state)
+            entry['_write'](state)
             return True
-        except Exception as e:
-            logger.error(f"Error setting {pump_id} on pin {pin} to {state}: {e}")
+        except Exception:
+            logger.exception("Error setting %s on pin %s to %s", pump_id, entry['pin'], state)
             return False
     
-    def run_pump(self, pump_id: str, state: bool) -> bool:
+    def run_pump(self, pump_id: str, state: bool, force: bool = False) -> bool:
         """Run or stop a pump
-        
+
         Args:
             pump_id: The pump to control
             state: True to turn on, False to turn off
-            
+            force: Write the pin even if the tracked state already matches
+
         Returns:
             bool: True if successful, False otherwise
         """
         with self.lock:
-            if pump_id not in self.pump_states:
-                logger.error(f"Unknown pump: {pump_id}")
-                return False
-            
-            # Convert bool to GPIO value (1 or 0)
-            gpio_state = 1 if state else 0
-            
-            if state:
-                # Turn on pump
-                success = self._set_pump(pump_id, gpio_state)
-                if success:
-                    self.pump_states[pump_id]['state'] = 'running'
-                    self.pump_states[pump_id]['start_time'] = time.time()
-                    logger.info(f"{pump_id} pump started")
-                return success
-            else:
-                # Turn off pump
-                success = self._set_pump(pump_id, gpio_state)
-                if success:
-                    self.pump_states[pump_id]['state'] = 'idle'
-                    self.pump_states[pump_id]['run_duration'] = 0
-                    logger.info(f"{pump_id} pump stopped")
-                return success
+            return self._run_pump_locked(pump_id, state, force)
+
+    def _run_pump_locked(self, pump_id: str, state: bool, force: bool = False) -> bool:
+        """run_pump body; caller must hold self.lock
+
+        Internal paths that already hold the lock (the stop scheduler,
+        all_pumps_off) call this directly so the lock can be a plain
+        non-reentrant Lock.
+        """
+        if pump_id not in self.pump_states:
+            logger.error(f"Unknown pump: {pump_id}")
+            return False
+
+        # Edge-triggered: skip the GPIO write if the pump is already
+        # in the requested state (unless forced, e.g. emergency stop)
+        current = self.pump_states[pump_id]['state']
+        if not force and current == ('running' if state else 'idle'):
+            return True
+
+        # Convert bool to GPIO value (1 or 0)
+        gpio_state = 1 if state else 0
+
+        if state:
+            # Turn on pump
+            success = self._set_pump(pump_id, gpio_state)
+            if success:
+                self.pump_states[pump_id]['state'] = 'running'
+                # Monotonic so elapsed-time math is immune to clock steps
+                self.pump_states[pump_id]['start_time'] = time.monotonic()
+                # Lazy args: per-toggle lines are debug-level and
+                # shouldn't cost a format call when filtered out
+                logger.debug("%s pump started", pump_id)
+            return success
+        else:
+            # Turn off pump
+            success = self._set_pump(pump_id, gpio_state)
+            if success:
+                self.pump_states[pump_id]['state'] = 'idle'
+                self.pump_states[pump_id]['run_duration'] = 0
+                logger.debug("%s pump stopped", pump_id)
+            return success
     
     def run_pump_for_seconds(self, pump_id: str, duration: float) -> bool:
         """Run a pump for a specific duration
@@ -218,50 +255,66 @@ class PumpManager:
         if duration <= 0:
             logger.warning(f"Invalid duration: {duration}")
             return False
-        
+
         if pump_id not in self.pump_states:
             logger.error(f"Unknown pump: {pump_id}")
             return False
-        
-        # Check if pump is already running
-        if pump_id in self.active_pumps:
-            logger.warning(f"{pump_id} pump is already running")
-            return False
-        
-        logger.info(f"Running {pump_id} pump for {duration:.1f} seconds")
-        
-        # Start the pump
-        success = self.run_pump(pump_id, True)
-        if not success:
-            return False
-        
-        # Create a thread to stop the pump after the duration
-        def stop_after_duration():
-            try:
-                self.active_pumps[pump_id] = True
-                time.sleep(duration)
-                
-                # If we still own this pump (it hasn't been stopped elsewhere)
-                with self.lock:
-                    if pump_id in self.active_pumps:
-                        logger.info(f"Auto-stopping {pump_id} pump after {duration:.1f}s")
-                        self.run_pump(pump_id, False)
-                        del self.active_pumps[pump_id]
-            except Exception as e:
-                logger.error(f"Error in timer thread for {pump_id}: {e}")
-                # Try to ensure pump is stopped on error
-                try:
-                    self.run_pump(pump_id, False)
-                    if pump_id in self.active_pumps:
-                        del self.active_pumps[pump_id]
-                except:
-                    pass
-        
-        # Start the timer thread
-        timer_thread = threading.Thread(target=stop_after_duration, daemon=True)
-        timer_thread.start()
-        
+
+        with self._stop_cond:
+            # Check if pump is already running
+            if pump_id in self.active_pumps:
+                logger.warning(f"{pump_id} pump is already running")
+                return False
+
+            logger.info(f"Running {pump_id} pump for {duration:.1f} seconds")
+
+            # Start the pump
+            success = self._run_pump_locked(pump_id, True)
+            if not success:
+                return False
+
+            # Hand the stop deadline to the scheduler thread
+            deadline = time.monotonic() + duration
+            self.active_pumps[pump_id] = deadline
+            heapq.heappush(self._stop_heap, (deadline, pump_id))
+            if self._stop_thread is None:
+                self._stop_thread = threading.Thread(
+                    target=self._stop_scheduler_loop, daemon=True)
+                self._stop_thread.start()
+            self._stop_cond.notify()
+
         return True
+
+    def _stop_scheduler_loop(self):
+        """Service all timed-run deadlines from a single thread
+
+        Sleeps on the condition until the earliest deadline in the heap,
+        then stops that pump. Entries whose pump was stopped elsewhere
+        (all_pumps_off, or a new timed run after a stop) are stale and
+        simply discarded.
+        """
+        with self._stop_cond:
+            while not self._shutdown:
+                if not self._stop_heap:
+                    self._stop_cond.wait()
+                    continue
+
+                deadline, pump_id = self._stop_heap[0]
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self._stop_cond.wait(timeout)
+                    continue
+
+                heapq.heappop(self._stop_heap)
+                if self.active_pumps.get(pump_id) != deadline:
+                    continue  # Stale: pump was stopped or re-armed
+
+                del self.active_pumps[pump_id]
+                try:
+                    logger.debug("Auto-stopping %s pump", pump_id)
+                    self._run_pump_locked(pump_id, False)
+                except Exception:
+                    logger.exception("Error auto-stopping %s", pump_id)
     
     def all_pumps_off(self) -> bool:
         """Emergency stop all pumps
@@ -276,9 +329,10 @@ class PumpManager:
             # Clear active pumps list
             self.active_pumps.clear()
             
-            # Stop each pump
+            # Stop each pump; force the writes so a pin that drifted out
+            # of sync with the tracked state still goes low
             for pump_id in self.pump_states:
-                pump_success = self.run_pump(pump_id, False)
+                pump_success = self._run_pump_locked(pump_id, False, force=True)
                 if not pump_success:
                     success = False
         
@@ -296,13 +350,15 @@ class PumpManager:
         if pump_id not in self.pump_states:
             return {'state': 'unknown'}
         
-        state = self.pump_states[pump_id].copy()
+        # Copy without the private bound-write helper (not serializable)
+        state = {k: v for k, v in self.pump_states[pump_id].items()
+                 if not k.startswith('_')}
         
         # Calculate runtime for active pumps
         if state['state'] == 'running':
-            elapsed = time.time() - state['start_time']
+            elapsed = time.monotonic() - state['start_time']
             state['elapsed'] = elapsed
-        
+
         return state
     
     def calibrate_pump_automated(self, pump_id: str, volume_ml: float, run_time: float) -> float:
@@ -327,29 +383,62 @@ class PumpManager:
         # Calculate new flow rate
         new_rate = volume_ml / run_time
         
-        # Update pump configuration
+        # Update pump configuration; pump_config is the same dict the
+        # config manager holds (set_setting in _init_gpio stored the
+        # reference), so mutating it in place is enough
         with self.lock:
             self.pump_states[pump_id]['flow_rate'] = new_rate
-            
-            # Update the config
+
             if pump_id in self.pump_config:
                 self.pump_config[pump_id]['flow_rate'] = new_rate
             else:
                 self.pump_config[pump_id] = {'pin': self.pump_states[pump_id]['pin'], 'flow_rate': new_rate}
-            
-            self.config.set_setting('pumps', self.pump_config)
-            self.config.save_config()
-        
+
+            self._mark_config_dirty()
+
         logger.info(f"Calibrated {pump_id} pump: {new_rate:.2f} ml/sec")
         return new_rate
+
+    def _mark_config_dirty(self):
+        """Schedule a debounced config save
+
+        Repeated calibrations within the delay window coalesce into a
+        single disk write; cleanup() flushes anything still pending.
+        """
+        with self._save_lock:
+            self._config_dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self._save_delay, self._flush_config)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _flush_config(self):
+        """Write the config to disk if there are unsaved changes"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._config_dirty:
+                return
+            self._config_dirty = False
+        try:
+            self.config.save_config()
+        except Exception:
+            logger.exception("Error saving pump config")
     
     def cleanup(self):
         """Clean up resources on shutdown"""
         logger.info("Cleaning up pump manager")
         
-        # Stop all pumps
+        # Stop all pumps and retire the stop-scheduler thread
         self.all_pumps_off()
-        
+        with self._stop_cond:
+            self._shutdown = True
+            self._stop_cond.notify()
+
+        # Persist any pending calibration changes
+        self._flush_config()
+
         # Close GPIO if using hardware
         if not self.simulation_mode and self.h is not None:
             try:
@@ -361,5 +450,5 @@ class PumpManager:
                 # Close GPIO chip
                 self.gpio.gpiochip_close(self.h)
                 logger.info("GPIO resources cleaned up")
-            except Exception as e:
-                logger.error(f"Error cleaning up GPIO: {e}") 
\ No newline at end of file
+            except Exception:
+                logger.exception("Error cleaning up GPIO") 
\ No newline at end of file
@@ -176,8 +176,16 @@ class ConfigManager:
             bool: True if successful, False otherwise
         """
         try:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            # Serialize once, then write to a temp file and atomically
+            # replace the config so a crash mid-write can't leave a
+            # truncated file behind
+            data = json.dumps(self.config, indent=4).encode('utf-8')
+            tmp_path = self.config_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
             logger.info(f"Saved configuration to {self.config_path}")
             return True
         except Exception as e:
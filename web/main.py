@@ -867,10 +867,12 @@ def api_save_pump_calibration():
         system_manager.config_manager.set_setting('pumps', pumps_config)
         system_manager.config_manager.save_config()
         
-        # Update dosing controller settings if needed
+        # Update dosing controller settings if needed; go through the
+        # update path so its cached per-pump parameters are rebuilt
         if system_manager.dosing_controller:
             rate_key = f"{pump_name}_rate"
-            system_manager.dosing_controller.settings[rate_key] = flow_rate
+            system_manager.dosing_controller.update_nutrient_settings(
+                {rate_key: flow_rate})
         
         return jsonify({
             'status': 'success',